@@ -0,0 +1,123 @@
+'''
+    This script pushes the time bucket aggregation of the readings down to PostgreSQL: one grouped query per
+    interval (date_trunc with sum/count/min/max) and one for the weekday view (extract of year/month/day of week),
+    so only aggregated rows travel to Python
+'''
+
+# Import necessary dependencies
+import pandas as pd
+from sqlalchemy import text
+from plots import time_interval_mapping
+from rollups import bucket_labels
+
+# date_trunc field of every interval
+date_trunc_fields = {
+    "hourly": "hour",
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month"
+}
+
+
+def window_clause(window) -> tuple:
+    '''
+        Returns the WHERE clause and parameters restricting a query to a (start, end) window, if any.
+    '''
+
+    if window is None:
+        return '', {}
+    start, end = window
+    return 'WHERE timestamp BETWEEN :start AND :end', {'start': start, 'end': end}
+
+
+def interval_query(table_name: str, interval: str, window=None):
+    '''
+        Returns the grouped query (and its parameters) computing the buckets of an interval.
+    '''
+
+    where, params = window_clause(window)
+    query = text(
+        f"SELECT date_trunc('{date_trunc_fields[interval]}', timestamp) AS bucket, "
+        f"sum(power) AS sum, count(power) AS count, min(power) AS min, max(power) AS max "
+        f'FROM "{table_name}" {where} GROUP BY 1 ORDER BY 1')
+    return query, params
+
+
+def weekday_query(table_name: str, window=None):
+    '''
+        Returns the query (and its parameters) computing the mean daily power per (year, month, day of week).
+        Every day from the first to the last reading is counted, days without readings having a NULL mean like
+        resample does, so weekdays only falling in gaps have a NULL mean rather than no row.
+    '''
+
+    where, params = window_clause(window)
+    query = text(
+        f"WITH daily AS (SELECT date_trunc('day', timestamp) AS day, avg(power) AS power "
+        f'FROM "{table_name}" {where} GROUP BY 1), '
+        f"days AS (SELECT generate_series(min(day), max(day), interval '1 day') AS day FROM daily) "
+        f"SELECT extract(year FROM days.day)::int AS year, extract(month FROM days.day)::int AS month, "
+        f"extract(isodow FROM days.day)::int - 1 AS day, avg(daily.power) AS power "
+        f"FROM days LEFT JOIN daily ON daily.day = days.day GROUP BY 1, 2, 3 ORDER BY 1, 2, 3")
+    return query, params
+
+
+def to_buckets(rows, interval: str) -> pd.DataFrame:
+    '''
+        Converts the rows of an interval query to rollup buckets labelled like pandas resample labels.
+    '''
+
+    frame = pd.DataFrame(rows, columns=['bucket', 'sum', 'count', 'min', 'max'])
+    frame['bucket'] = pd.to_datetime(frame['bucket'])
+    frame.index = pd.DatetimeIndex(bucket_labels(frame['bucket'], interval), name='timestamp')
+    return frame[['sum', 'count', 'min', 'max']].astype(float)
+
+
+def to_weekday_means(rows) -> pd.Series:
+    '''
+        Converts the rows of the weekday query to the series expected by `plots.get_weekday_plots`.
+    '''
+
+    frame = pd.DataFrame(rows, columns=['year', 'month', 'day', 'power'])
+    return frame.set_index(['year', 'month', 'day'])['power'].astype(float)
+
+
+def query_rollups(connection, table_name: str, window=None) -> dict:
+    '''
+        Runs the interval queries on a synchronous connection and returns the rollup buckets of every interval.
+    '''
+
+    rollups = {}
+    for interval in time_interval_mapping:
+        query, params = interval_query(table_name, interval, window)
+        rollups[interval] = to_buckets(connection.execute(query, params).all(), interval)
+    return rollups
+
+
+def query_weekday_means(connection, table_name: str, window=None) -> pd.Series:
+    '''
+        Runs the weekday query on a synchronous connection.
+    '''
+
+    query, params = weekday_query(table_name, window)
+    return to_weekday_means(connection.execute(query, params).all())
+
+
+async def query_rollups_async(session, table_name: str, window=None) -> dict:
+    '''
+        Same as query_rollups, through an async session.
+    '''
+
+    rollups = {}
+    for interval in time_interval_mapping:
+        query, params = interval_query(table_name, interval, window)
+        rollups[interval] = to_buckets((await session.execute(query, params)).all(), interval)
+    return rollups
+
+
+async def query_weekday_means_async(session, table_name: str, window=None) -> pd.Series:
+    '''
+        Same as query_weekday_means, through an async session.
+    '''
+
+    query, params = weekday_query(table_name, window)
+    return to_weekday_means((await session.execute(query, params)).all())
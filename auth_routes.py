@@ -6,11 +6,14 @@
 from fastapi import APIRouter, status, Depends
 from fastapi_jwt_auth import AuthJWT
 from schemas import SignUpSchema, LoginSchema, SignUpResponseSchema, LoginResponseSchema, ErrorResonseSchema
-from database import Session, engine
+from database import get_session
 from models import User
 from fastapi.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Create an APIRouter for authentication-related routes
 auth_router = APIRouter(
@@ -18,13 +21,10 @@ auth_router = APIRouter(
     tags=['Authorization End Points']
 )
 
-# Create an SQLAlchemy session bound to the engine
-session = Session(bind=engine)
-
 
 # Define a FastAPI route for user registration (signup)
 @auth_router.post("/signup", response_model=SignUpResponseSchema, status_code=status.HTTP_201_CREATED, responses={400: {"description": "Bad Request", "model": ErrorResonseSchema}, 201: {"description": "Registered the user"}})
-def signup(user: SignUpSchema):
+async def signup(user: SignUpSchema, session: AsyncSession = Depends(get_session)):
     """
         ## Register the User
         This endpoint requires the following
@@ -33,7 +33,7 @@ def signup(user: SignUpSchema):
     """
 
     # check if the provided email already exists in the database
-    db_email = session.query(User).filter(User.email == user.email).first()
+    db_email = await session.scalar(select(User).where(User.email == user.email))
 
     # check if email already exist in the database
     if (db_email is not None):
@@ -41,25 +41,25 @@ def signup(user: SignUpSchema):
                             detail="User with the email already exists")
 
     # Check if the provided username already exists in the database
-    db_username = session.query(User).filter(
-        User.username == user.username).first()
+    db_username = await session.scalar(select(User).where(
+        User.username == user.username))
 
     # Check if username already exists in the database
     if (db_username is not None):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="User with the username already exists")
 
-    # create the new user
+    # create the new user (hashing is cpu bound, so it runs in the threadpool)
     new_user = User(
         username=user.username,
         email=user.email,
-        password=generate_password_hash(user.password),
+        password=await run_in_threadpool(generate_password_hash, user.password),
     )
 
     # add new user to table
     session.add(new_user)
     # commiting the changes in the database
-    session.commit()
+    await session.commit()
 
     # response object
     response = {
@@ -74,7 +74,7 @@ def signup(user: SignUpSchema):
 
 # Define a FastAPI route for user login (login)
 @auth_router.post("/login", responses={400: {"description": "Bad Request", "model": ErrorResonseSchema}})
-async def login(user: LoginSchema, Authorize: AuthJWT = Depends()):
+async def login(user: LoginSchema, Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_session)):
 
     """
         ## Login the User
@@ -84,10 +84,10 @@ async def login(user: LoginSchema, Authorize: AuthJWT = Depends()):
     """
 
     # Query the database for a user with the provided email
-    db_user = session.query(User).filter(User.email == user.email).first()
+    db_user = await session.scalar(select(User).where(User.email == user.email))
 
     # Check if a user with the provided email exists and the password matches
-    if db_user and check_password_hash(db_user.password, user.password):
+    if db_user and await run_in_threadpool(check_password_hash, db_user.password, user.password):
         access_token = Authorize.create_access_token(subject=db_user.email)
         response = {
             "accessToken": access_token
@@ -0,0 +1,179 @@
+'''
+    This script benchmarks the analysis pipeline on synthetic data. For every stage, category and row count it
+    reports the wall time (best of a few runs), the peak memory allocated and the size of the encoded output,
+    and can compare them with a stored baseline.
+
+    python -m benchmarks.run                                 every category, 10^3 to 10^5 rows
+    python -m benchmarks.run --rows 1e6 --categories fridge,solarpanel --stages get_plots
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json     exits with 1 on regressions
+'''
+
+# Import necessary dependencies
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+import numpy as np
+import pandas as pd
+from models import categories
+from utils import get_plots, get_stats
+from plots import night_time_zones, positive_slope_zones, get_aggregate_plots, get_weekday_plots, \
+    get_night_and_slope_highlight_plot
+from running_stats import RunningStatistics
+from rollups import compute_rollups, to_aggregates
+from cache import encode_value
+from benchmarks.synthetic import generate
+
+# Stages of the pipeline. Each one takes the readings, does its setup (untimed) and returns the call to measure
+stages = {
+    'get_stats': lambda df: partial(get_stats, df),
+    'running_statistics': lambda df: lambda: RunningStatistics.from_series(df['power']).to_stats(),
+    'rollups': lambda df: partial(compute_rollups, df),
+    'night_time_zones': lambda df: partial(night_time_zones, df),
+    'positive_slope_zones': lambda df: partial(positive_slope_zones, df, use_col='power', dist_to_check=5, min_slope=5),
+    'aggregate_plots': lambda df: partial(get_aggregate_plots, df),
+    'aggregate_plots_from_rollups': lambda df: partial(get_aggregate_plots, df, to_aggregates(compute_rollups(df))),
+    'weekday_plots': lambda df: partial(get_weekday_plots, df),
+    'night_and_slope_plot': lambda df: partial(get_night_and_slope_highlight_plot, df),
+    'get_plots': lambda df: partial(get_plots, df),
+    'encode_plots': lambda df: partial(encode_value, get_plots(df)),
+}
+
+
+def output_size(result):
+    '''
+        Returns the size in bytes of a stage's output encoded like it is cached, or None when it is not json.
+    '''
+
+    if isinstance(result, bytes):
+        return len(result)
+    try:
+        return len(encode_value(result))
+    except TypeError:
+        return None
+
+
+def measure(call, repeat: int) -> dict:
+    '''
+        Returns the best wall time of `repeat` calls, the peak memory allocated by one call and its output size.
+    '''
+
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = call()
+        seconds.append(time.perf_counter() - started)
+
+    # memory is traced in a separate call, tracing slows the calls down
+    gc.collect()
+    tracemalloc.start()
+    result = call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(seconds), 'peak_bytes': peak, 'output_bytes': output_size(result)}
+
+
+def run(rows: list, category_names: list, stage_names: list, interval: str, seed: int, repeat: int) -> list:
+    '''
+        Runs every stage on the synthetic readings of every category and row count, printing results as they come.
+    '''
+
+    results = []
+    print(f"{'stage':<30} {'category':<16} {'rows':>10} {'seconds':>10} {'peak MB':>10} {'output KB':>10}", flush=True)
+    for count in rows:
+        for category in category_names:
+            df = generate(category, count, interval=interval, seed=seed)
+            for stage in stage_names:
+                result = {'stage': stage, 'category': category, 'rows': count,
+                          **measure(stages[stage](df), repeat)}
+                results.append(result)
+                output = f"{result['output_bytes'] / 1024:>10.1f}" if result['output_bytes'] is not None else f"{'-':>10}"
+                print(f"{stage:<30} {category:<16} {count:>10} {result['seconds']:>10.4f} "
+                      f"{result['peak_bytes'] / 2 ** 20:>10.1f} {output}", flush=True)
+    return results
+
+
+def compare(results: list, baseline: dict, threshold: float, min_seconds: float) -> list:
+    '''
+        Returns the results which are slower, or allocate more memory, than their baseline by more than threshold
+        (a fraction). Times below min_seconds are too noisy to be compared.
+    '''
+
+    reference = {(item['stage'], item['category'], item['rows']): item for item in baseline['results']}
+    regressions = []
+    for result in results:
+        base = reference.get((result['stage'], result['category'], result['rows']))
+        if base is None:
+            continue
+        slower = (result['seconds'] > base['seconds'] * (1 + threshold)
+                  and result['seconds'] - base['seconds'] > min_seconds)
+        bigger = result['peak_bytes'] > base['peak_bytes'] * (1 + threshold)
+        if slower or bigger:
+            regressions.append({**result, 'baseline_seconds': base['seconds'], 'baseline_peak_bytes': base['peak_bytes']})
+    return regressions
+
+
+def environment() -> dict:
+    '''
+        Returns the versions the results were measured with, stored along with a baseline.
+    '''
+
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'processor': platform.processor()}
+
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic power traces")
+    parser.add_argument('--rows', default='1e3,1e4,1e5',
+                        help="comma separated row counts, e.g. 1e3,1e5,1e7 (default 1e3,1e4,1e5)")
+    parser.add_argument('--categories', default=','.join(categories),
+                        help="comma separated categories (default all of models.categories)")
+    parser.add_argument('--stages', default=','.join(stages),
+                        help=f"comma separated stages among {', '.join(stages)} (default all)")
+    parser.add_argument('--interval', default='1min', help="sampling interval of the readings (default 1min)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic readings (default 0)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per measurement, the best is kept (default 3)")
+    parser.add_argument('--output', help="write the results to this json file")
+    parser.add_argument('--save-baseline', metavar='PATH', help="store the results as the baseline at PATH")
+    parser.add_argument('--compare', metavar='PATH', help="compare the results with the baseline at PATH")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="fraction by which a stage may be slower or allocate more than its baseline (default 0.2)")
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help="time differences below this are ignored as noise (default 0.005)")
+    args = parser.parse_args()
+
+    rows = [int(float(count)) for count in args.rows.split(',')]
+    category_names = [name.strip() for name in args.categories.split(',') if name.strip()]
+    stage_names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in category_names if name not in categories] + [name for name in stage_names if name not in stages]
+    if unknown:
+        parser.error(f"unknown categories or stages: {', '.join(unknown)}")
+
+    results = run(rows, category_names, stage_names, args.interval, args.seed, args.repeat)
+    report = {'environment': environment(), 'interval': args.interval, 'seed': args.seed, 'results': results}
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline.get('interval'), baseline.get('seed')) != (args.interval, args.seed):
+            print("Warning: the baseline was measured with another interval or seed")
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        for item in regressions:
+            print(f"REGRESSION {item['stage']} {item['category']} {item['rows']}: "
+                  f"{item['baseline_seconds']:.4f}s -> {item['seconds']:.4f}s, "
+                  f"{item['baseline_peak_bytes'] / 2 ** 20:.1f}MB -> {item['peak_bytes'] / 2 ** 20:.1f}MB")
+        print(f"{len(regressions)} regression(s) against {args.compare}")
+        sys.exit(1 if regressions else 0)
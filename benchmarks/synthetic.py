@@ -0,0 +1,118 @@
+'''
+    This script generates deterministic synthetic power traces for the benchmarks. Every category of
+    `models.categories` has a profile describing its standby and active power and when it is active
+'''
+
+# Import necessary dependencies
+import zlib
+import numpy as np
+import pandas as pd
+from models import categories
+
+# Profiles of the categories. kind is one of
+#   'always'   constant draw around the base power
+#   'cycling'  on for duty * period minutes of every period (compressors, thermostats), during hours
+#   'window'   on at the peak power during hours, standby outside
+#   'events'   events_per_day uses of duration minutes at random times during hours
+#   'solar'    production following the sun between hours, reduced by clouds
+# hours is the (start, end) hour of the day the category is active in, end may wrap around midnight
+profiles = {
+    'printer3d': dict(kind='events', base=4, peak=120, hours=(8, 23), events_per_day=0.6, duration=240, noise=0.05),
+    'airconditioner': dict(kind='cycling', base=5, peak=1200, hours=(11, 22), period=30, duty=0.6, noise=0.08),
+    'airpurifier': dict(kind='window', base=2, peak=35, hours=(7, 23), noise=0.1),
+    'boiler': dict(kind='cycling', base=3, peak=2000, hours=(5, 23), period=90, duty=0.25, noise=0.03),
+    'coffee': dict(kind='events', base=1, peak=1400, hours=(6, 18), events_per_day=3, duration=3, noise=0.05),
+    'computer': dict(kind='window', base=3, peak=180, hours=(9, 19), noise=0.2),
+    'dehumidifier': dict(kind='cycling', base=1, peak=250, hours=(0, 24), period=120, duty=0.4, noise=0.05),
+    'dishwasher': dict(kind='events', base=1, peak=1800, hours=(19, 23), events_per_day=0.8, duration=120, noise=0.15),
+    'dryer': dict(kind='events', base=1, peak=2500, hours=(10, 21), events_per_day=0.4, duration=90, noise=0.1),
+    'fan': dict(kind='window', base=0, peak=45, hours=(12, 2), noise=0.05),
+    'freezer': dict(kind='cycling', base=2, peak=110, hours=(0, 24), period=50, duty=0.35, noise=0.05),
+    'fridge': dict(kind='cycling', base=2, peak=90, hours=(0, 24), period=40, duty=0.4, noise=0.05),
+    'internetrouter': dict(kind='always', base=9, peak=9, hours=(0, 24), noise=0.05),
+    'laptop': dict(kind='window', base=1, peak=45, hours=(18, 23), noise=0.25),
+    'microwaveoven': dict(kind='events', base=2, peak=1100, hours=(11, 21), events_per_day=2, duration=4, noise=0.05),
+    'phonecharger': dict(kind='window', base=0.1, peak=12, hours=(23, 6), noise=0.3),
+    'printer': dict(kind='events', base=3, peak=450, hours=(9, 18), events_per_day=4, duration=2, noise=0.1),
+    'radiator': dict(kind='cycling', base=0, peak=1500, hours=(17, 8), period=60, duty=0.5, noise=0.03),
+    'screen': dict(kind='window', base=0.5, peak=30, hours=(9, 19), noise=0.1),
+    'solarpanel': dict(kind='solar', base=0, peak=3000, hours=(6, 20), noise=0.3),
+    'soundsystem': dict(kind='window', base=4, peak=60, hours=(19, 23), noise=0.4),
+    'tv': dict(kind='window', base=0.5, peak=110, hours=(19, 24), noise=0.15),
+    'vacuumcleaner': dict(kind='events', base=0, peak=1600, hours=(9, 20), events_per_day=0.3, duration=30, noise=0.1),
+    'washingmachine': dict(kind='events', base=1, peak=2000, hours=(8, 22), events_per_day=0.7, duration=100, noise=0.2),
+}
+
+missing = set(categories) - set(profiles)
+if missing:
+    raise RuntimeError(f"No synthetic profile for categories {sorted(missing)}")
+
+
+def _within_hours(hour_of_day: np.ndarray, hours: tuple) -> np.ndarray:
+    # boolean mask of the readings whose hour of the day is inside the (start, end) window
+    start, end = hours
+    if start <= end:
+        return (hour_of_day >= start) & (hour_of_day < end)
+    return (hour_of_day >= start) | (hour_of_day < end)
+
+
+def _events(minutes: np.ndarray, hours: tuple, per_day: float, duration: float, rng) -> np.ndarray:
+    # boolean mask of the readings covered by events starting at random times within the hours of each day
+    days = int(minutes[-1] // 1440) + 1
+    counts = rng.poisson(per_day, days)
+    day = np.repeat(np.arange(days), counts)
+    start, end = hours
+    window = (end - start) % 24 or 24
+    event_starts = day * 1440 + (start + rng.random(day.size) * window) * 60
+    event_ends = event_starts + duration * rng.uniform(0.7, 1.3, day.size)
+
+    # +1 where an event starts and -1 where it ends, the running sum is positive inside events
+    edges = np.zeros(minutes.size + 1, dtype=np.int64)
+    np.add.at(edges, np.searchsorted(minutes, event_starts), 1)
+    np.add.at(edges, np.searchsorted(minutes, event_ends), -1)
+    return np.cumsum(edges[:-1]) > 0
+
+
+def generate(category_name: str, rows: int, interval: str = '1min', start: str = '2023-01-01',
+             seed: int = 0) -> pd.DataFrame:
+    '''
+        Generates `rows` readings of a category, one every `interval`, starting at `start`.
+        The same arguments always generate the same readings.
+    '''
+
+    profile = profiles[category_name]
+    rng = np.random.default_rng([seed, zlib.crc32(category_name.encode('utf-8'))])
+
+    offsets = np.arange(rows, dtype=np.int64) * pd.Timedelta(interval).value
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(offsets, unit='ns')
+    minutes = offsets / 60e9
+    hour_of_day = (minutes / 60 + pd.Timestamp(start).hour) % 24
+
+    kind = profile['kind']
+    base, peak = profile['base'], profile['peak']
+    active = _within_hours(hour_of_day, profile['hours'])
+
+    if kind == 'always':
+        power = np.full(rows, float(base))
+    elif kind == 'cycling':
+        # every cycle starts at a random phase so categories do not switch on in sync
+        phase = rng.random() * profile['period']
+        on = ((minutes + phase) % profile['period']) < profile['duty'] * profile['period']
+        power = np.where(active & on, peak, base).astype(float)
+    elif kind == 'window':
+        power = np.where(active, peak, base).astype(float)
+    elif kind == 'events':
+        on = _events(minutes, profile['hours'], profile['events_per_day'], profile['duration'], rng)
+        power = np.where(on, peak, base).astype(float)
+    elif kind == 'solar':
+        sun_start, sun_end = profile['hours']
+        elevation = np.clip(np.sin(np.pi * (hour_of_day - sun_start) / (sun_end - sun_start)), 0, None)
+        # clouds change slowly: a random walk folded into a 30% to 100% clear sky factor
+        clouds = 0.65 + 0.35 * np.cos(np.cumsum(rng.normal(0, 0.02, rows)))
+        power = peak * elevation * clouds
+    else:
+        raise ValueError(f"Unknown profile kind '{kind}'")
+
+    # multiplicative noise, power never goes below zero
+    power *= 1 + rng.normal(0, profile['noise'], rows)
+    return pd.DataFrame({'timestamp': timestamps, 'power': np.clip(power, 0, None)})
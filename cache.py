@@ -0,0 +1,238 @@
+'''
+    This script provides the redis clients shared by the application and the binary format of the cached values
+'''
+
+# Import necessary dependencies
+import gzip
+import hashlib
+import time
+import orjson
+import redis
+import redis.asyncio
+from metrics import PAYLOAD_BYTES, REDIS_LATENCY, cache_lookup
+from config import REDIS_URL, REDIS_MAX_CONNECTIONS
+
+# brotli is optional, payloads are only precompressed with gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# every cached value starts with these magic bytes followed by one byte of schema version
+CACHE_MAGIC = b'PRSM'
+CACHE_VERSION = 1
+HEADER_SIZE = len(CACHE_MAGIC) + 1
+
+# blocking client used by the background refresh and the bootstrap script
+redis_client = redis.Redis(connection_pool=redis.ConnectionPool.from_url(
+    REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS))
+
+# asyncio client used by the routes
+async_redis_client = redis.asyncio.Redis(connection_pool=redis.asyncio.ConnectionPool.from_url(
+    REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS))
+
+
+def get_redis() -> redis.Redis:
+    '''
+        Returns the shared blocking redis client.
+    '''
+
+    return redis_client
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    '''
+        Returns the shared asyncio redis client.
+    '''
+
+    return async_redis_client
+
+
+def use_clients(client: redis.Redis, async_client: redis.asyncio.Redis):
+    '''
+        Replaces the shared clients, e.g. by clients of a local stand-in server for load tests.
+        Must be called before the clients are first used.
+    '''
+
+    global redis_client, async_redis_client
+    redis_client, async_redis_client = client, async_client
+
+
+def encode_value(value) -> bytes:
+    '''
+        Serializes a value to the versioned binary format (header + orjson bytes).
+    '''
+
+    return CACHE_MAGIC + bytes([CACHE_VERSION]) + orjson.dumps(
+        value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def encode_fields(fields: dict) -> bytes:
+    '''
+        Combines values serialized with encode_value into the serialized dict of them, without parsing them again.
+    '''
+
+    members = b','.join(orjson.dumps(name) + b':' + value_body(data) for name, data in fields.items())
+    return CACHE_MAGIC + bytes([CACHE_VERSION]) + b'{' + members + b'}'
+
+
+def value_body(data: bytes) -> bytes:
+    '''
+        Returns the JSON body of a cached value without parsing it. Raises ValueError for unknown formats.
+    '''
+
+    if data is None or not data.startswith(CACHE_MAGIC):
+        raise ValueError("Not a cached value")
+    if data[len(CACHE_MAGIC)] != CACHE_VERSION:
+        raise ValueError(f"Unsupported cache value version {data[len(CACHE_MAGIC)]}")
+    return data[HEADER_SIZE:]
+
+
+def decode_value(data: bytes):
+    '''
+        Deserializes a value stored with encode_value.
+    '''
+
+    return orjson.loads(value_body(data))
+
+
+def payload_keys(key: str) -> dict:
+    '''
+        Returns the redis keys holding the precompressed variants and the etag of a cached payload.
+    '''
+
+    return {'gzip': f'{key}_gzip', 'br': f'{key}_br', 'etag': f'{key}_etag'}
+
+
+def payload_entries(key: str, value) -> dict:
+    '''
+        Returns the cached value (or value already serialized with encode_value) together with its gzip (and brotli)
+        compressed json body and an etag derived from the content, keyed by their redis keys. Keys mapped to None
+        are stale and have to be deleted.
+    '''
+
+    data = value if isinstance(value, bytes) else encode_value(value)
+    body = value_body(data)
+    keys = payload_keys(key)
+
+    entries = {
+        key: data,
+        keys['gzip']: gzip.compress(body, compresslevel=6),
+        keys['br']: brotli.compress(body, quality=5) if brotli is not None else None,
+        keys['etag']: f'"{hashlib.sha256(body).hexdigest()[:32]}"'.encode('utf-8'),
+    }
+    for encoding, name in (('identity', key), ('gzip', keys['gzip']), ('br', keys['br'])):
+        if entries[name] is not None:
+            PAYLOAD_BYTES.labels(encoding).observe(len(entries[name]))
+    return entries
+
+
+def store_entries(pipe, entries: dict):
+    '''
+        Queues on a pipeline the entries built by payload_entries, deleting the ones mapped to None.
+    '''
+
+    for key, value in entries.items():
+        if value is None:
+            pipe.delete(key)
+        else:
+            pipe.set(key, value)
+
+
+def store_payload(pipe, key: str, value) -> bytes:
+    '''
+        Queues on a pipeline the cached value together with its precompressed variants and etag,
+        so routes can serve it without any encoding work.
+    '''
+
+    entries = payload_entries(key, value)
+    store_entries(pipe, entries)
+    return entries[key]
+
+
+def accepted_encodings(accept_encoding: str) -> list:
+    '''
+        Returns the precompressed encodings accepted by a client, best first ('br', 'gzip' then 'identity').
+    '''
+
+    accepted = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+
+    encodings = []
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        encodings.append('br')
+    if 'gzip' in accepted or '*' in accepted:
+        encodings.append('gzip')
+    return encodings + ['identity']
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    '''
+        Checks an If-None-Match header against an etag.
+    '''
+
+    if not if_none_match or not etag:
+        return False
+    candidates = [item.strip().removeprefix('W/') for item in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class ResultCache:
+
+    """
+    Redis backed cache of computed results.
+
+    Every entry expires after `ttl` seconds and, beyond `max_entries`, the least recently used entries
+    are evicted. Recency is tracked in a sorted set scored by the time of last access.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, ttl: int):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index_key = f'{namespace}_lru'
+
+    def key(self, name: str) -> str:
+        return f'{self.namespace}_{name}'
+
+    async def get(self, name: str):
+        '''
+            Returns the stored bytes of an entry (see encode_value) or None, and marks it as recently used.
+        '''
+
+        redis_client = get_async_redis()
+        key = self.key(name)
+        with REDIS_LATENCY.labels('get').time():
+            data = await redis_client.get(key)
+        cache_lookup(self.namespace, data is not None)
+        if data is not None:
+            await redis_client.zadd(self.index_key, {key: time.time()})
+        return data
+
+    async def set(self, name: str, value) -> bytes:
+        '''
+            Stores a value and evicts the expired and least recently used entries. Returns the stored bytes.
+        '''
+
+        redis_client = get_async_redis()
+        key = self.key(name)
+        data = encode_value(value)
+        now = time.time()
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(key, data, ex=self.ttl)
+            pipe.zadd(self.index_key, {key: now})
+            pipe.zremrangebyscore(self.index_key, '-inf', now - self.ttl)
+            pipe.zcard(self.index_key)
+            size = (await pipe.execute())[-1]
+
+        # evicting the least recently used entries beyond max_entries
+        if size > self.max_entries:
+            evicted = await redis_client.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                await redis_client.delete(*(member for member, _ in evicted))
+        return data
@@ -3,24 +3,37 @@
 '''
 
 # import necessary dependencies
-from fastapi import APIRouter, status, Depends, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, status, Depends, UploadFile, File, Request, Query, Path
+from fastapi.responses import HTMLResponse, Response
 from fastapi_jwt_auth import AuthJWT
-from schemas import PowerConsumptionSchema, ResponseSchema, ErrorResonseSchema, StatisticsResonseSchema
-from database import Session, engine
+from schemas import PowerConsumptionSchema, ResponseSchema, BatchResponseSchema, JobSchema, ErrorResonseSchema, StatisticsResonseSchema
+from database import get_session
 from models import User
 from fastapi.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 from fastapi.encoders import jsonable_encoder
 from models import category_classes, categories
-from utils import get_plots, get_stats, delete_file
 import pandas as pd
-import ast
-import redis
-from init_redis import savePlot, saveStatistics
-import aiofiles
+from init_redis import updateStatistics, updateRollups, mergeRollups
+from rollups import compute_rollups
+from plots import plot_names, plots_key
+from refresh import refresh_worker
+from streaming import analyse_file, spool_upload
+from jobs import job_queue, get_job, set_job
+from utils import delete_file, to_legacy_plots, get_weekday_month_plot
+from config import PLOT_DETAIL_LEVELS, CSV_CHUNK_SIZE, UPLOAD_CACHE_MAX_ENTRIES, UPLOAD_CACHE_TTL, UPLOAD_DIR
+from cache import ResultCache, get_async_redis, value_body, encode_value, decode_value, encode_fields, payload_keys, accepted_encodings, etag_matches
+from metrics import REDIS_LATENCY, DB_LATENCY, cache_lookup
+from windows import resolve_window, window_statistics, window_plots
+from datetime import datetime
+from pydantic import parse_obj_as
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from collections import defaultdict
+import os
 import re
 import json
+import uuid
 
 
 # Create an APIRouter for data-related routes
@@ -29,17 +42,41 @@ data_router = APIRouter(
     tags=['Data Related End Points']
 )
 
-# Session and Redis Setup
-session = Session(bind=engine)
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+# cache of the results of uploaded csv files, keyed by the sha256 digest of their content
+upload_cache = ResultCache('upload', UPLOAD_CACHE_MAX_ENTRIES, UPLOAD_CACHE_TTL)
+
+# function to convert stored plots to the body expected by former clients, where every plot is a json string
+def legacy_plots_body(data):
+    return json.dumps(to_legacy_plots(decode_value(data))).encode('utf-8')
+
+# function to parse the comma separated names of the requested plots, raising a 422 for unknown plots
+def requested_plots(plots):
+    if plots is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in plots.split(',') if name.strip()))
+    unknown = [name for name in names if name not in plot_names]
+    if unknown or not names:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Unknown plots {unknown}, expected some of {plot_names}")
+    return names
+
+# function to resolve the requested time window of a route, raising a 422 when it is invalid
+def requested_window(start, end, interval):
+    try:
+        return resolve_window(start, end, interval)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
 # Route for Getting Statistics
 @data_router.get("/statistics/{category_name}", response_model=StatisticsResonseSchema, responses={401: {"description": "Invalid Token", "model": ErrorResonseSchema}, 404: {"description": "Not Found", "model": ErrorResonseSchema}})
-def get_statistics(category_name: str, Authorize: AuthJWT = Depends()):
+async def get_statistics(category_name: str, start: datetime = None, end: datetime = None, interval: str = None,
+                         Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_session)):
     """
         ## Get Statistics of specific device category
         This is protected endpoint and requires the following
         - category : string
+        - start, end : datetime (optional), restrict the statistics to readings within this window
+        - interval : string (optional), lookback before end such as '12h', '7d' or '4w' when start is not given
         - accessToken        
     """
 
@@ -60,27 +97,48 @@ def get_statistics(category_name: str, Authorize: AuthJWT = Depends()):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Category '{category_name}' not found")
     
+    # statistics over a time window are computed from the readings of that window only
+    window = requested_window(start, end, interval)
+    if window is not None:
+        data = await window_statistics(session, category_name, window)
+        if data is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="No data in the requested window")
+        return Response(content=value_body(data), media_type="application/json")
+
     try:
-        # fetching the statistics from desired category in form of byte string
-        response_bstring = redis_client.get(f'{category_name}_statistics')
-        # decoding the string in utf-8 format
-        response_string = response_bstring.decode('utf-8')
-        # evaluate the string and convert it to valid data structure
-        response = ast.literal_eval(response_string)
-    except : 
+        # fetching the statistics of desired category, the cached value already holds the json body
+        with REDIS_LATENCY.labels('get').time():
+            data = await get_async_redis().get(f'{category_name}_statistics')
+        cache_lookup('statistics', data is not None)
+        response = value_body(data)
+    except ValueError:
         print("Failed to convert the response string")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Statistics of '{category_name}' are not available yet")
 
     # returning the response in json format
-    return jsonable_encoder(response)
+    return Response(content=response, media_type="application/json")
 
 # Route for Getting Plot
-@data_router.get("/plot/{category_name}")
-def get_plot(category_name: str, Authorize: AuthJWT = Depends()):
+@data_router.get("/plot/{category_name}", responses={304: {"description": "Not Modified"}, 503: {"description": "Not available yet", "model": ErrorResonseSchema}})
+async def get_plot(category_name: str, request: Request, max_points: int = Query(None, ge=3),
+                   start: datetime = None, end: datetime = None, interval: str = None, legacy: bool = False,
+                   plots: str = None, Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_session)):
     """
         ## Get Plot of specific device category
         This is protected endpoint and requires the following
         - category : string
+        - max_points : integer (optional), maximum number of readings drawn in the night and slope highlighted plot,
+          at least the coarsest precomputed level of detail unless a time window is given
+        - start, end : datetime (optional), restrict the plots to readings within this window
+        - interval : string (optional), lookback before end such as '12h', '7d' or '4w' when start is not given
+        - legacy : boolean (optional), every plot encoded as a json string as in former versions
+        - plots : string (optional), comma separated names of the plots to return, e.g. 'daily_plot,weekly_plot'
         - accessToken
+
+        Without a selection of plots, the body is served precompressed (Content-Encoding) and carries an ETag, send it back in
+        If-None-Match to get a 304 when the plots did not change.
     """
 
     '''
@@ -101,23 +159,156 @@ def get_plot(category_name: str, Authorize: AuthJWT = Depends()):
                             detail=f"Category '{category_name}' not found")
     
     
-    # fetching plot's json string from redis
-    try:
-        response_string = redis_client.get(f'{category_name}_plot')
-        response = json.loads(response_string)
-    except :
-        print("Failed to convert response string")
-        return
+    # the selected plots, or None for all of them
+    names = requested_plots(plots)
+
+    # plots over a time window are computed from the readings of that window only
+    window = requested_window(start, end, interval)
+    if window is not None:
+        data = await window_plots(session, category_name, window, max_points)
+        if data is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="No data in the requested window")
+        if names is not None:
+            window_document = decode_value(data)
+            data = encode_value({name: window_document[name] for name in names})
+        if legacy:
+            return Response(content=legacy_plots_body(data), media_type="application/json")
+        return Response(content=value_body(data), media_type="application/json")
+
+    # the most detailed precomputed level within max_points
+    level = None
+    if max_points is not None and PLOT_DETAIL_LEVELS:
+        levels = sorted(PLOT_DETAIL_LEVELS)
+        if max_points < levels[0]:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=f"max_points must be at least {levels[0]}, the coarsest precomputed level of "
+                                       f"detail, or come with a time window")
+        level = max(level for level in levels if level <= max_points)
+
+    # fetching only the selected fields of the hash of plots. The downsampled night and slope highlighted plot
+    # is only stored when the readings exceed the level, so the full one is fetched along with it
+    if names is not None:
+        fields = list(names)
+        if level is not None:
+            fields.append(f'night_and_slope_highlighted_plot_lod{level}')
+        with REDIS_LATENCY.labels('hmget').time():
+            values = dict(zip(fields, await get_async_redis().hmget(plots_key(category_name), fields)))
+        if level is not None and values[fields[-1]] is not None and 'night_and_slope_highlighted_plot' in names:
+            values['night_and_slope_highlighted_plot'] = values[fields[-1]]
+        missing = any(values[name] is None for name in names)
+        cache_lookup('plot', not missing)
+        if missing:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=f"Plots of '{category_name}' are not available yet")
+        data = encode_fields({name: values[name] for name in names})
+        if legacy:
+            return Response(content=legacy_plots_body(data), media_type="application/json")
+        return Response(content=value_body(data), media_type="application/json")
+
+    # fetching the etag and the plot's body in the best encoding accepted by the client from redis
+    key = f'{category_name}_plot' if level is None else f'{category_name}_plot_lod{level}'
+
+    # former clients get every plot as a json string, converted from the stored document
+    if legacy:
+        with REDIS_LATENCY.labels('get').time():
+            data = await get_async_redis().get(key)
+        cache_lookup('plot', data is not None)
+        if data is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=f"Plots of '{category_name}' are not available yet")
+        return Response(content=legacy_plots_body(data), media_type="application/json")
+
+    # the variants are fetched in the order of preference of the client, a missing one (e.g. brotli when the
+    # plots were stored without it) falls back to the next
+    keys = {**payload_keys(key), 'identity': key}
+    encodings = accepted_encodings(request.headers.get('accept-encoding', ''))
+    with REDIS_LATENCY.labels('mget').time():
+        etag, *payloads = await get_async_redis().mget(keys['etag'], *(keys[encoding] for encoding in encodings))
+    encoding, payload = next(((encoding, payload) for encoding, payload in zip(encodings, payloads)
+                              if payload is not None), (None, None))
+    cache_lookup('plot', payload is not None)
+    etag = etag.decode('utf-8') if etag is not None else None
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding'} if etag else {'Vary': 'Accept-Encoding'}
+
+    # the client already has this version of the plots
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if payload is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Plots of '{category_name}' are not available yet")
+
+    if encoding == 'identity':
+        try:
+            payload = value_body(payload)
+        except ValueError:
+            print("Failed to convert response string")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=f"Plots of '{category_name}' are not available yet")
+    else:
+        headers['Content-Encoding'] = encoding
+
+    # returning the stored bytes as they are
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
+# Route for Getting the weekday plot of one month
+@data_router.get("/plot/{category_name}/weekday/{year}/{month}", responses={404: {"description": "Not Found", "model": ErrorResonseSchema}, 503: {"description": "Not available yet", "model": ErrorResonseSchema}})
+async def get_weekday_plot(category_name: str, year: int, month: int = Path(..., ge=1, le=12),
+                           Authorize: AuthJWT = Depends()):
+    """
+        ## Get the mean power per day of the week of one month of a specific device category
+        This is protected endpoint and requires the following
+        - category : string
+        - year : integer
+        - month : integer, 1 to 12
+        - accessToken
+    """
 
-        
+    '''
+        # uncomment this block to use this route protected
 
-    # returning the response in json format
-    return jsonable_encoder(response)
+        try:
+        # Check if the request is authorized with a valid JWT token
+        Authorize.jwt_required()
+    except Exception as e:
+        # If authorization fails, raise an HTTP 401 Unauthorized exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token")
+    '''
+
+    # check if category is valid device name
+    if category_name not in categories:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Category '{category_name}' not found")
+
+    # the year x month x day of week means stored with the plots
+    with REDIS_LATENCY.labels('get').time():
+        data = await get_async_redis().get(f'{category_name}_weekday')
+    cache_lookup('weekday', data is not None)
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Plots of '{category_name}' are not available yet")
+    weekday = decode_value(data)
+
+    # the months without any entry are not plotted
+    means = present = None
+    if year in weekday['years']:
+        position = weekday['years'].index(year)
+        means = tuple(weekday['means'][position][month - 1])
+        present = tuple(weekday['present'][position][month - 1])
+    if means is None or not any(present):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"No data for {year}-{month:02d}")
+
+    # rendering only the requested month, renders of unchanged means are memoized
+    return Response(content=get_weekday_month_plot(year, month, means, present), media_type="application/json")
 
 
 # Route for Adding Data
 @data_router.post("/add", status_code=status.HTTP_201_CREATED, response_model=ResponseSchema, responses={201: {"description": "successfully added the data"}, 401: {"description": "Invalid Token", "model": ErrorResonseSchema}, 404: {"description": "Not Found", "model": ErrorResonseSchema}})
-async def add_data(dataPoint: PowerConsumptionSchema, Authorize: AuthJWT = Depends()):
+async def add_data(dataPoint: PowerConsumptionSchema, Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_session)):
 
     """
         ## Add the power data to specific device
@@ -150,11 +341,12 @@ async def add_data(dataPoint: PowerConsumptionSchema, Authorize: AuthJWT = Depen
     # Adding the data to respected table
     session.add(category_data)
     # commiting the changes
-    session.commit()
+    await session.commit()
 
-    # update the plot and statistics in redis
-    savePlot(dataPoint.category)
-    saveStatistics(dataPoint.category)
+    # update the rollups and statistics in redis, the plots are refreshed in the background
+    await updateRollups(dataPoint.category, dataPoint.timestamp, dataPoint.power)
+    await updateStatistics(dataPoint.category, [dataPoint.power])
+    refresh_worker.mark_dirty(dataPoint.category)
 
     # Prepare a response message
     response = {
@@ -164,12 +356,90 @@ async def add_data(dataPoint: PowerConsumptionSchema, Authorize: AuthJWT = Depen
     # returning the response in json format
     return jsonable_encoder(response)
 
+# function to load data points into the table of a category with a single COPY (atomic on its own)
+async def copy_points(session, category_name, points):
+    table_name = category_classes[category_name].__tablename__
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    with DB_LATENCY.labels('async', 'COPY').time():
+        await raw_connection.driver_connection.copy_records_to_table(
+            table_name,
+            records=[(point.timestamp, point.power, point.category) for point in points],
+            columns=['timestamp', 'power', 'category'])
+    await session.commit()
+
+# Route for Adding Data in batch
+@data_router.post("/add/batch", status_code=status.HTTP_201_CREATED, response_model=BatchResponseSchema, responses={201: {"description": "successfully added the data"}, 401: {"description": "Invalid Token", "model": ErrorResonseSchema}, 404: {"description": "Not Found", "model": ErrorResonseSchema}, 422: {"description": "Invalid data points", "model": ErrorResonseSchema}})
+async def add_data_batch(request: Request, Authorize: AuthJWT = Depends(), session: AsyncSession = Depends(get_session)):
+
+    """
+        ## Add a batch of power data points, possibly of several devices
+        This is protected endpoint and requires the following
+        - body : JSON array of PowerConsumptionSchema, or one PowerConsumptionSchema per line (application/x-ndjson)
+        - accessToken
+    """
+
+    '''
+        # uncomment this block to use this route as protected
+
+        try:
+        # Check if the request is authorized with a valid JWT token
+        Authorize.jwt_required()
+    except Exception as e:
+        # If authorization fails, raise an HTTP 401 Unauthorized exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token")
+    '''
+
+    # parsing and validating every data point of the body
+    body = await request.body()
+    try:
+        if 'ndjson' in request.headers.get('content-type', ''):
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            records = json.loads(body)
+        dataPoints = parse_obj_as(List[PowerConsumptionSchema], records)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Invalid data points: {str(e)}")
+
+    # grouping the data points by category
+    grouped = defaultdict(list)
+    for dataPoint in dataPoints:
+        grouped[dataPoint.category].append(dataPoint)
+
+    # Check if every category exists in category_classes dictionary
+    unknown = [category for category in grouped if category not in category_classes]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Category '{', '.join(unknown)}' not found")
+
+    for category, points in grouped.items():
+        # loading the points of the category in one transaction
+        await copy_points(session, category, points)
+
+        # update the rollups and statistics once for the whole batch, the plots are refreshed in the background
+        batch_df = pd.DataFrame({'timestamp': pd.to_datetime([point.timestamp for point in points]),
+                                 'power': [point.power for point in points]})
+        await mergeRollups(category, compute_rollups(batch_df))
+        await updateStatistics(category, batch_df['power'])
+        refresh_worker.mark_dirty(category)
+
+    # Prepare a response message
+    response = {
+        "message": "Data added successfully",
+        "counts": {category: len(points) for category, points in grouped.items()}
+    }
+
+    # returning the response in json format
+    return jsonable_encoder(response)
+
 # Route for uploading the custom file
-@data_router.post("/custom")
+@data_router.post("/custom", status_code=status.HTTP_202_ACCEPTED, response_model=JobSchema, responses={406: {"description": "Not a CSV File", "model": ErrorResonseSchema}, 429: {"description": "Too many jobs", "model": ErrorResonseSchema}})
 async def process_csv(file: UploadFile = File(...), Authorize: AuthJWT = Depends()):
 
     """
-        ## Upload csv file and get plots and statistics
+        ## Upload csv file and get the id of the job generating its plots and statistics
         This is protected endpoint and requires the following
         - CSV file
     """
@@ -194,30 +464,69 @@ async def process_csv(file: UploadFile = File(...), Authorize: AuthJWT = Depends
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Not a CSV File")
 
-    # reading from file and save it in uploads folder. Additionally generating plots and statistics
+    # handing the file over to the worker processes in the uploads folder, hashing it on the way
+    path = os.path.join(UPLOAD_DIR, f'{uuid.uuid4().hex}.csv')
     try:
-        async with aiofiles.open(f'uploads/{file.filename}', 'wb') as f:
-            while contents := await file.read(1024 * 1024):
-                await f.write(contents)
-
-        df = pd.read_csv(f'uploads/{file.filename}')
-        plots_json = get_plots(df)
-        stats = get_stats(df)
-
-        response = {
-            "statistics": stats,
-            "plots": plots_json
-        }
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        job_id = await spool_upload(file, path, CSV_CHUNK_SIZE)
 
     # throwing an error if reading the file is not possible
     except Exception as e:
+        await delete_file(path)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="There was an error uploading the file")
 
-    # close the opened file and removing the file from uploads folder
     finally:
         await file.close()
-        await delete_file(f'uploads/{file.filename}')
+
+    # the same content always gives the same result, so the job id is the digest of the file: a cached
+    # result or a job already queued for the same content is reused
+    if await upload_cache.get(job_id) is not None:
+        await delete_file(path)
+        return {"job_id": job_id, "status": "done"}
+
+    job = await get_job(job_id)
+    if job is not None and job['status'] != 'failed':
+        await delete_file(path)
+        return {"job_id": job_id, **job}
+
+    if job_queue.full():
+        await delete_file(path)
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail="Too many files are being processed, try again later")
+    await set_job(job_id, 'queued')
+
+    async def store(result):
+        await upload_cache.set(job_id, result)
+
+    # the analysis reads the file in chunks folded into running aggregates, and deletes it
+    job_queue.submit(job_id, store, analyse_file, path, CSV_CHUNK_SIZE)
+    return {"job_id": job_id, "status": "queued"}
+
+# Route for getting the status, and once done the plots and statistics, of an uploaded file
+@data_router.get("/custom/{job_id}", responses={404: {"description": "Unknown or expired job", "model": ErrorResonseSchema}})
+async def get_csv_result(job_id: str, legacy: bool = False, Authorize: AuthJWT = Depends()):
+
+    """
+        ## Get the status of a csv job, with the plots and statistics once it is done
+        This is protected endpoint and requires the following
+        - Job id
+        - legacy : boolean (optional), every plot encoded as a json string as in former versions
+    """
+
+    # the result is kept in the upload cache, the status only while the job is queued, running or failed
+    data = await upload_cache.get(job_id)
+    if data is not None and legacy:
+        result = decode_value(data)
+        result['plots'] = to_legacy_plots(result['plots'])
+        return jsonable_encoder({"job_id": job_id, "status": "done", "result": result})
+    if data is not None:
+        content = b'{"job_id":' + json.dumps(job_id).encode('utf-8') + b',"status":"done","result":' + value_body(data) + b'}'
+        return Response(content=content, media_type="application/json")
+
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown or expired job")
 
     # returning the response in json format
-    return jsonable_encoder(response)
+    return jsonable_encoder({"job_id": job_id, **job})
@@ -0,0 +1,94 @@
+'''
+    This script provides the downsampling used to keep large line plots light: Largest-Triangle-Three-Buckets (LTTB)
+    and min/max per bucket. Both return the integer locations of the points to keep, so callers can align
+    anything else (night zones, slope highlights) with the original rows
+'''
+
+# Import necessary dependencies
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Returns the integer locations of the max_points points selected by Largest-Triangle-Three-Buckets.
+    The first and last points are always kept
+    """
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        raise ValueError("LTTB needs to keep at least 3 points")
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # The inner points are split into max_points - 2 buckets of (almost) equal size
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average point of the next bucket (the last point for the last bucket)
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+
+        # Keep the point forming the largest triangle with the previously kept point and the next average
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                      (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.nanargmax(area)) if not np.isnan(area).all() else start
+        selected[i + 1] = previous
+
+    return selected
+
+
+def minmax(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Returns the integer locations of at most max_points points: the first and last points, and the minimum and
+    maximum of (max_points - 2) // 2 equal buckets of the points in between, in order
+    """
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 2:
+        raise ValueError("Min/max decimation needs to keep at least 2 points")
+
+    y = np.asarray(y, dtype=float)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+
+    # The inner points are split into buckets of (almost) equal size, each keeping up to 2 points
+    buckets = (max_points - 2) // 2
+    if buckets == 0:
+        return np.flatnonzero(keep)
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(edges))
+    inner = y[1:n - 1]
+
+    # fmin/fmax skip missing readings when computing the extremes of each bucket
+    bucket_min = np.fmin.reduceat(y[:n - 1], edges[:-1])
+    bucket_max = np.fmax.reduceat(y[:n - 1], edges[:-1])
+
+    # Keep the first location of the minimum and of the maximum of every bucket
+    for mask in (inner == bucket_min[bucket_of], inner == bucket_max[bucket_of]):
+        locations = np.flatnonzero(mask)
+        _, first = np.unique(bucket_of[locations], return_index=True)
+        keep[locations[first] + 1] = True
+
+    return np.flatnonzero(keep)
+
+
+def decimate(x: np.ndarray, y: np.ndarray, max_points: int, method: str = 'lttb') -> np.ndarray:
+    """
+    Returns the integer locations of the points kept by the given method ('lttb' or 'minmax')
+    """
+    if method == 'lttb':
+        return lttb(x, y, max_points)
+    if method == 'minmax':
+        return minmax(y, max_points)
+    raise ValueError(f"Unknown decimation method '{method}'")
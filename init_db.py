@@ -1,10 +1,46 @@
 '''
-    This Python script is responsible for creating database tables based on the models defined
+    This Python script is responsible for creating database tables based on the models defined.
+
+    python init_db.py                  creates the tables (and the partitions when partitioning is enabled)
+    python init_db.py --migrate        adds the timestamp index to existing tables and, when partitioning is
+                                       enabled, moves their readings into monthly partitions
+    python init_db.py --partitions     creates the upcoming monthly partitions (run it monthly)
+    python init_db.py --retain-months N  drops the readings (partitions) older than N months
 '''
 
 # Import necessary modules
+import argparse
+from datetime import datetime
 from database import engine, Base
+from config import TABLE_PARTITIONING
+from partitioning import ensure_upcoming_partitions, drop_partitions_before, migrate, month_start
+from snapshot import reset_snapshot
+from models import categories
 
 # Table creation
 if (__name__ == '__main__'):
-    Base.metadata.create_all(bind=engine)
+    parser = argparse.ArgumentParser(description="Create or migrate the database tables")
+    parser.add_argument('--migrate', action='store_true', help="migrate the tables of an existing deployment")
+    parser.add_argument('--partitions', action='store_true', help="create the upcoming monthly partitions")
+    parser.add_argument('--retain-months', type=int, help="drop the readings older than this many months")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate(engine, TABLE_PARTITIONING)
+        for category in categories:
+            reset_snapshot(category)
+    elif not args.partitions and args.retain_months is None:
+        Base.metadata.create_all(bind=engine)
+
+    if TABLE_PARTITIONING:
+        ensure_upcoming_partitions(engine)
+
+    if args.retain_months is not None:
+        cutoff = month_start(datetime.utcnow())
+        for _ in range(args.retain_months):
+            cutoff = datetime(cutoff.year - (cutoff.month == 1), (cutoff.month - 2) % 12 + 1, 1)
+        drop_partitions_before(engine, cutoff)
+
+        # the local snapshots still hold the deleted readings
+        for category in categories:
+            reset_snapshot(category)
@@ -1,41 +1,269 @@
 '''
     This script is used to initially configure the redis with statistics and plots of distinct devices.
+
+    python init_redis.py                 builds every category in parallel, one worker process per core
+    python init_redis.py --workers N     uses N worker processes
+    python init_redis.py --sequential    builds the categories one after the other in this process
 '''
 
 # Import necessary Dependency
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from models import categories
-import pandas as pd
 from database import engine
-import plotly.express as px
-import json
-import redis
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from utils import get_plots, get_stats
-
-# setup the redis client at defined host, port and use defined database
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
-
-# function to save plot as json format in redis
-def savePlot(category_name):
-    df = pd.read_sql_table(
-        table_name=f"{category_name}_power_consumption", con=engine)
-    plots_json = get_plots(df)
-    redis_client.set(f'{category_name}_plot', json.dumps(plots_json))
-
-# function to store statistics as json format in the redis
-def saveStatistics(category_name):
-    df = pd.read_sql_table(
-        table_name=f"{category_name}_power_consumption", con=engine)
-    stats = get_stats(df)
-    redis_client.set(f'{category_name}_statistics', str(stats))
-
-# function to save statistics and plots for available categories of devices
-def saveData():
-    for category in categories:
-        saveStatistics(category)
-        savePlot(category)
+from starlette.concurrency import run_in_threadpool
+from utils import get_plots, get_stats, get_detail_level_plots
+from config import PLOT_DETAIL_LEVELS
+from running_stats import RunningStatistics
+from rollups import UPDATE_BUCKET_SCRIPT, rollup_key, bucket_label, encode_bucket, decode_rollup, to_aggregates
+from plots import time_interval_mapping, weekday_pivot, plots_key
+from aggregation import query_rollups, query_weekday_means
+from snapshot import load_snapshot
+from cache import get_redis, get_async_redis, encode_value, decode_value, payload_entries, store_entries, encode_fields
+from metrics import STAGE_LATENCY, REDIS_LATENCY
+
+# function to load the full table of a category, from its local snapshot and the rows added since
+def loadTable(category_name):
+    with STAGE_LATENCY.labels('load_table').time():
+        return load_snapshot(engine, category_name)
+
+# function to build the plot payloads of a category, keyed by their redis keys, and the hash of its plots
+# (one field per plot). Aggregate plots are built from the rollup buckets and the weekday plots from
+# means aggregated by the database, unless given
+def plotEntries(category_name, df, rollups, weekdays=None):
+    if weekdays is None:
+        with engine.connect() as connection:
+            weekdays = query_weekday_means(connection, f"{category_name}_power_consumption")
+    plots_json = get_plots(df, to_aggregates(rollups), weekday_means=weekdays)
+
+    # every plot is encoded once, the documents below are assembled from the encoded plots
+    with STAGE_LATENCY.labels('encode_plots').time():
+        fields = {name: encode_value(plot) for name, plot in plots_json.items()}
+    night_plot = 'night_and_slope_highlighted_plot'
+
+    # the payloads are stored with their compressed variants and etag
+    with STAGE_LATENCY.labels('compress_plots').time():
+        entries = payload_entries(f'{category_name}_plot', encode_fields(fields))
+
+    # the year x month x day of week means, from which the plot of a single month is rendered on demand
+    years, means, present = weekday_pivot(weekdays)
+    entries[f'{category_name}_weekday'] = encode_value({"years": years, "means": means, "present": present})
+
+    # precomputed levels of detail, where the night and slope highlighted plot is downsampled
+    detail_fields = {}
+    for level in PLOT_DETAIL_LEVELS:
+        if len(df.index) > level:
+            detail_fields[f'{night_plot}_lod{level}'] = encode_value(get_detail_level_plots(df, level)[night_plot])
+        night = detail_fields.get(f'{night_plot}_lod{level}', fields[night_plot])
+        entries.update(payload_entries(f'{category_name}_plot_lod{level}', encode_fields({**fields, night_plot: night})))
+    return entries, {plots_key(category_name): {**fields, **detail_fields}}
+
+# function to build the rollup hashes of a category, keyed by their redis keys
+def rollupEntries(category_name, rollups):
+    return {rollup_key(category_name, interval): {label.isoformat(): encode_bucket(*bucket)
+                                                  for label, bucket in zip(buckets.index, buckets.itertuples(index=False))}
+            for interval, buckets in rollups.items()}
+
+# function to build the statistics of a category and the running aggregate used by updateStatistics
+def statisticsEntries(category_name, df):
+    running = RunningStatistics.from_series(df['power'])
+    return {f'{category_name}_running_statistics': encode_value(running.to_dict()),
+            f'{category_name}_statistics': encode_value(get_stats(df))}
+
+# function to write entries and rollup hashes built by the functions above in one transaction
+def writeEntries(entries, hashes=None):
+    pipe = get_redis().pipeline()
+    for key, mapping in (hashes or {}).items():
+        pipe.delete(key)
+        if mapping:
+            pipe.hset(key, mapping=mapping)
+    store_entries(pipe, entries)
+    with REDIS_LATENCY.labels('pipeline').time():
+        pipe.execute()
+
+# function to save plot as json format in redis. The rollup buckets are rebuilt from the table when
+# missing or when rebuild is set
+def savePlot(category_name, rebuild=False, df=None):
+    if df is None:
+        df = loadTable(category_name)
+    with STAGE_LATENCY.labels('save_plot').time():
+        rollups = None if rebuild else loadRollups(category_name)
+        if rollups is None:
+            rollups = saveRollups(category_name)
+        writeEntries(*plotEntries(category_name, df, rollups))
+
+# function to (re)build the hourly, daily, weekly and monthly rollup buckets of a category, aggregated by the database
+def saveRollups(category_name):
+    with engine.connect() as connection:
+        rollups = query_rollups(connection, f"{category_name}_power_consumption")
+    writeEntries({}, rollupEntries(category_name, rollups))
+    return rollups
+
+# function to load the rollup buckets of a category, returns None if they were never built
+def loadRollups(category_name):
+    pipe = get_redis().pipeline()
+    for interval in time_interval_mapping:
+        pipe.hgetall(rollup_key(category_name, interval))
+    with REDIS_LATENCY.labels('pipeline').time():
+        hashes = pipe.execute()
+    if not any(hashes):
+        return None
+    return {interval: decode_rollup(fields) for interval, fields in zip(time_interval_mapping, hashes)}
+
+# function to fold a new reading into the bucket of every interval it falls into
+async def updateRollups(category_name, timestamp, power):
+    redis_client = get_async_redis()
+
+    # bootstrap from the table if the rollups were never built (the new reading is already committed), folding it
+    # into an empty hash would leave a single bucket that loadRollups takes for the whole history
+    if not await redis_client.exists(*(rollup_key(category_name, interval) for interval in time_interval_mapping)):
+        await run_in_threadpool(saveRollups, category_name)
+        return
+
+    update_bucket = redis_client.register_script(UPDATE_BUCKET_SCRIPT)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for interval in time_interval_mapping:
+            label = bucket_label(timestamp, interval).isoformat()
+            await update_bucket(keys=[rollup_key(category_name, interval)],
+                                args=[label, power, 1, power, power], client=pipe)
+        with REDIS_LATENCY.labels('pipeline').time():
+            await pipe.execute()
+
+# function to fold the rollup buckets of a batch of new readings (see rollups.compute_rollups) into the stored ones
+async def mergeRollups(category_name, rollups):
+    redis_client = get_async_redis()
+
+    # bootstrap from the table if the rollups were never built (the batch is already committed)
+    if not await redis_client.exists(*(rollup_key(category_name, interval) for interval in time_interval_mapping)):
+        await run_in_threadpool(saveRollups, category_name)
+        return
+
+    update_bucket = redis_client.register_script(UPDATE_BUCKET_SCRIPT)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for interval, buckets in rollups.items():
+            for label, bucket in zip(buckets.index, buckets.itertuples(index=False)):
+                await update_bucket(keys=[rollup_key(category_name, interval)],
+                                    args=[label.isoformat(), *(float(value) for value in bucket)], client=pipe)
+        with REDIS_LATENCY.labels('pipeline').time():
+            await pipe.execute()
+
+# function to store statistics in the redis. It also (re)builds the running aggregate used by
+# updateStatistics, so it only needs to be called to bootstrap a category
+def saveStatistics(category_name, df=None):
+    if df is None:
+        df = loadTable(category_name)
+    with STAGE_LATENCY.labels('save_statistics').time():
+        writeEntries(statisticsEntries(category_name, df))
+
+# function to fold newly inserted power values into the running aggregate and refresh the statistics in O(1)
+async def updateStatistics(category_name, values):
+    redis_client = get_async_redis()
+    key = f'{category_name}_running_statistics'
+
+    # bootstrap from the table if the running aggregate does not exist yet (the new values are already committed)
+    if not await redis_client.exists(key):
+        await run_in_threadpool(saveStatistics, category_name)
+        return
+
+    # read-modify-write of the aggregate inside a WATCH transaction so concurrent inserts are not lost
+    async def apply(pipe):
+        running = RunningStatistics.from_dict(decode_value(await pipe.get(key)))
+        running.update_many(values)
+        pipe.multi()
+        pipe.set(key, encode_value(running.to_dict()))
+        pipe.set(f'{category_name}_statistics', encode_value(running.to_stats()))
+
+    with REDIS_LATENCY.labels('transaction').time():
+        await redis_client.transaction(apply, key)
+
+# function to recompute plots and statistics of a category from a single load of its table. The running aggregate
+# is owned by updateStatistics and only rebuilt when missing, overwriting it here would drop the readings inserted
+# since the table was loaded
+def refreshCategory(category_name, rebuild=False):
+    df = loadTable(category_name)
+    if not get_redis().exists(f'{category_name}_running_statistics'):
+        saveStatistics(category_name, df)
+    else:
+        with STAGE_LATENCY.labels('save_statistics').time():
+            writeEntries({f'{category_name}_statistics': encode_value(get_stats(df))})
+    savePlot(category_name, rebuild, df)
+
+# function to build everything cached for a category from a single load of its table, run in the
+# warm-up worker processes. Returns the entries and rollup hashes to write and the time spent per stage
+def buildCategory(category_name):
+    timings = {}
+    started = time.perf_counter()
+
+    df = loadTable(category_name)
+    timings['load'] = time.perf_counter() - started
+
+    entries = statisticsEntries(category_name, df)
+    timings['statistics'] = time.perf_counter() - started - sum(timings.values())
+
+    with engine.connect() as connection:
+        rollups = query_rollups(connection, f"{category_name}_power_consumption")
+    timings['rollups'] = time.perf_counter() - started - sum(timings.values())
+
+    plot_entries, plot_hashes = plotEntries(category_name, df, rollups)
+    entries.update(plot_entries)
+    timings['plots'] = time.perf_counter() - started - sum(timings.values())
+    return entries, {**rollupEntries(category_name, rollups), **plot_hashes}, timings
+
+# function run once in every warm-up worker process: the connections of the pool inherited from the
+# parent must not be shared with it
+def _initWorker():
+    engine.dispose(close=False)
+
+# function yielding (category, result, error) as the categories are built, by a pool of worker processes
+# (one per core unless workers is given) or one after the other when sequential is set
+def _buildCategories(workers=None, sequential=False):
+    if sequential:
+        for category in categories:
+            try:
+                yield category, buildCategory(category), None
+            except Exception as error:
+                yield category, None, error
+        return
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_initWorker) as executor:
+        futures = {executor.submit(buildCategory, category): category for category in categories}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, error
+
+# function to save statistics and plots for available categories of devices. Categories are built in
+# parallel and written to redis by this process as they complete
+def saveData(workers=None, sequential=False):
+    started = time.perf_counter()
+    failed = []
+    for done, (category, result, error) in enumerate(_buildCategories(workers, sequential), 1):
+        if error is not None:
+            failed.append(category)
+            print(f"[{done}/{len(categories)}] {category}: failed ({error!r})", flush=True)
+            continue
+
+        entries, hashes, timings = result
+        write_started = time.perf_counter()
+        writeEntries(entries, hashes)
+        timings['write'] = time.perf_counter() - write_started
+
+        stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+        print(f"[{done}/{len(categories)}] {category}: {sum(timings.values()):.2f}s ({stages})", flush=True)
+
+    print(f"Built {len(categories) - len(failed)} of {len(categories)} categories in {time.perf_counter() - started:.2f}s", flush=True)
+    if failed:
+        raise RuntimeError(f"Failed to build categories: {', '.join(failed)}")
 
 
 if (__name__ == '__main__'):
-    saveData()
+    parser = argparse.ArgumentParser(description="Build the statistics and plots of every category in redis")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes (defaults to the number of cores)")
+    parser.add_argument('--sequential', action='store_true',
+                        help="build the categories one after the other in this process")
+    args = parser.parse_args()
+    saveData(workers=args.workers, sequential=args.sequential)
@@ -0,0 +1,103 @@
+'''
+    This script runs the analysis of uploaded csv files as jobs on a bounded pool of worker processes, so they
+    never block the event loop. The status of a job is kept in redis while it is queued, running or failed
+'''
+
+# Import necessary dependencies
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from cache import get_async_redis, encode_value, decode_value
+from config import JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_STATUS_TTL
+
+
+def job_key(job_id: str) -> str:
+    '''
+        Returns the redis key of the status of a job
+    '''
+
+    return f'job_{job_id}'
+
+
+async def get_job(job_id: str):
+    '''
+        Returns the status of a job ({"status", "detail"}) or None when it is unknown, finished or expired.
+    '''
+
+    data = await get_async_redis().get(job_key(job_id))
+    return decode_value(data) if data is not None else None
+
+
+async def set_job(job_id: str, status: str, detail: str = None):
+    '''
+        Stores the status of a job for JOB_STATUS_TTL seconds.
+    '''
+
+    await get_async_redis().set(job_key(job_id), encode_value({"status": status, "detail": detail}), ex=JOB_STATUS_TTL)
+
+
+class JobQueue:
+
+    """
+    Bounded pool of worker processes.
+
+    At most `workers` jobs run at once and at most `queue_depth` more wait for a worker; `full` tells
+    when further jobs have to be refused. Workers are spawned (not forked from the server) on the first job.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_depth: int = JOB_QUEUE_DEPTH):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = None
+        self._slots = None
+        self._active = 0
+        self._tasks = set()
+
+    def full(self) -> bool:
+        """
+        Returns whether the running and waiting jobs already fill the pool and its queue
+        """
+        return self._active >= self.workers + self.queue_depth
+
+    def active(self) -> int:
+        """
+        Returns the number of jobs running or waiting for a worker
+        """
+        return self._active
+
+    def submit(self, job_id: str, store, function, *args):
+        """
+        Runs function(*args) in a worker process and hands its result to `await store(result)`.
+        Failures are recorded in the status of the job
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._slots = asyncio.Semaphore(self.workers)
+
+        self._active += 1
+        task = asyncio.get_running_loop().create_task(self._run(job_id, store, function, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job_id: str, store, function, args):
+        try:
+            async with self._slots:
+                await set_job(job_id, 'running')
+                result = await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+            await store(result)
+            # the result is served from where store put it, the status is no longer needed
+            await get_async_redis().delete(job_key(job_id))
+        except Exception as e:
+            await set_job(job_id, 'failed', str(e))
+        finally:
+            self._active -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# queue shared by the routes and shut down with the application
+job_queue = JobQueue()
@@ -6,13 +6,19 @@
 from fastapi import FastAPI
 from fastapi_jwt_auth import AuthJWT
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.routing import APIRoute
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
 from schemas import Settings
 from auth_routes import auth_router
 from data_routes import data_router
+from refresh import refresh_worker
+from jobs import job_queue
+from config import TABLE_PARTITIONING
+from database import engine
+from partitioning import ensure_upcoming_partitions
+from metrics import MetricsMiddleware, REFRESH_PENDING, JOBS_ACTIVE, latest
 import re
 import inspect
 
@@ -30,11 +36,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Observing the latency and response size of every route, exposed at /metrics with the other metrics
+app.add_middleware(MetricsMiddleware)
+REFRESH_PENDING.set_function(refresh_worker.pending)
+JOBS_ACTIVE.set_function(job_queue.active)
+
 # Including routes defined in auth_router and data_router
 app.include_router(auth_router)
 app.include_router(data_router)
 
 
+# Route exposing the metrics in the Prometheus text format
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = latest()
+    return Response(content=content, headers={'Content-Type': content_type})
+
+
+# Starting the background refresh of plots and statistics with the app and stopping it on shutdown
+@app.on_event("startup")
+def start_refresh_worker():
+    refresh_worker.start()
+
+
+# Making sure the monthly partitions of the coming months exist when tables are partitioned
+@app.on_event("startup")
+def create_upcoming_partitions():
+    if TABLE_PARTITIONING:
+        ensure_upcoming_partitions(engine)
+
+
+@app.on_event("shutdown")
+def stop_refresh_worker():
+    refresh_worker.stop()
+
+
+# Stopping the worker processes of the csv analysis jobs on shutdown
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_queue.shutdown()
+
+
 # Defining a function get_config that loads the configuration from Settings class
 @AuthJWT.load_config
 def get_config():
@@ -0,0 +1,108 @@
+'''
+    This script provides the Prometheus metrics of the backend: latency and response size of the routes, time spent
+    in the stages of the plot and statistics pipeline, in database queries and in redis calls, size of the stored
+    payloads and hits and misses of the cached values. They are exposed by the /metrics route of main.py
+'''
+
+# Import necessary dependencies
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+
+# buckets of the sizes in bytes, from 256 B to 16 MiB
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(9))
+
+REQUEST_LATENCY = Histogram('prism_request_duration_seconds', "Latency of the requests, by route template",
+                            ['method', 'route', 'status'])
+RESPONSE_BYTES = Histogram('prism_response_bytes', "Size of the response bodies as sent, by route template",
+                           ['method', 'route'], buckets=SIZE_BUCKETS)
+
+STAGE_LATENCY = Histogram('prism_stage_duration_seconds', "Time spent in the stages of the plot and statistics pipeline",
+                          ['stage'], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120))
+DB_LATENCY = Histogram('prism_db_query_duration_seconds', "Latency of the database queries, by engine and statement",
+                       ['engine', 'statement'])
+REDIS_LATENCY = Histogram('prism_redis_duration_seconds', "Latency of the redis calls, by command",
+                          ['command'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+
+PAYLOAD_BYTES = Histogram('prism_payload_bytes', "Size of the payloads stored in redis, by encoding",
+                          ['encoding'], buckets=SIZE_BUCKETS)
+CACHE_REQUESTS = Counter('prism_cache_requests_total', "Lookups of cached values, by cache and result (hit or miss)",
+                         ['cache', 'result'])
+
+REFRESH_PENDING = Gauge('prism_refresh_pending_categories', "Categories waiting for a background refresh")
+JOBS_ACTIVE = Gauge('prism_jobs_active', "Csv analysis jobs running or waiting for a worker process")
+
+
+def cache_lookup(cache: str, hit: bool):
+    '''
+        Counts a lookup of a cached value as a hit or a miss.
+    '''
+
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def instrument_engine(engine, name: str):
+    '''
+        Observes the latency of every statement executed by a (sync) engine.
+    '''
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_query(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info['query_started'].pop()
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'EMPTY'
+        DB_LATENCY.labels(name, keyword).observe(time.perf_counter() - started)
+
+    # statements that failed never reach after_cursor_execute
+    @event.listens_for(engine, 'handle_error')
+    def failed_query(context):
+        starts = context.connection.info.get('query_started') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+def latest() -> tuple:
+    '''
+        Returns the metrics in the Prometheus text format and its content type.
+    '''
+
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+
+    """
+    ASGI middleware observing the latency and response size of every request.
+
+    Requests are labelled by the template of the route they matched (e.g. /data/plot/{category_name}), so the
+    number of series does not grow with the categories or ids requested.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        response = {'status': 500, 'size': 0}
+
+        async def send_and_observe(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['size'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_observe)
+        finally:
+            route = scope.get('route')
+            path = getattr(route, 'path', 'unmatched')
+            REQUEST_LATENCY.labels(scope['method'], path, str(response['status'])).observe(time.perf_counter() - started)
+            RESPONSE_BYTES.labels(scope['method'], path).observe(response['size'])
@@ -3,7 +3,8 @@
 '''
 
 from database import Base
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index
+from config import TIMESTAMP_INDEX_TYPE, TABLE_PARTITIONING
 
 # Define a User class that inherits from the Base class
 
@@ -34,18 +35,32 @@ class PowerConsumption(Base):
 
     Attributes:
         id (int): Primary key for the table.
-        timestamp (DateTime): Date and time of the power consumption record.
+        timestamp (DateTime): Date and time of the power consumption record. Part of the primary key
+            when tables are partitioned by month, since PostgreSQL requires the partition key in it.
         power (Float): Power consumption value.
         category (String): Category of the power-consuming device.
     """
 
     __abstract__ = True
-    id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime, nullable=False, primary_key=TABLE_PARTITIONING)
     power = Column(Float, nullable=False)
     category = Column(String, nullable=False)
 
 
+def power_consumption_table_args(table_name: str) -> tuple:
+    """
+    Returns the table arguments of a per-category table: the index on timestamp (B-tree or BRIN)
+    and, when enabled, the monthly range partitioning on timestamp.
+    """
+    table_args = (
+        Index(f"ix_{table_name}_timestamp", "timestamp", postgresql_using=TIMESTAMP_INDEX_TYPE),
+    )
+    if TABLE_PARTITIONING:
+        table_args += ({"postgresql_partition_by": "RANGE (timestamp)"},)
+    return table_args
+
+
 # Define a dictionary to store category classes
 category_classes = {}
 
@@ -62,6 +77,7 @@ for category in categories:
     exec(f'''
 class {class_name}(PowerConsumption):
     __tablename__ = "{table_name}"
+    __table_args__ = power_consumption_table_args("{table_name}")
 
 category_classes["{category}"] = {class_name}
     
@@ -0,0 +1,149 @@
+'''
+    This script manages the monthly range partitions of the per-category tables and migrates existing
+    deployments to the indexed (and optionally partitioned) layout
+'''
+
+# Import necessary dependencies
+from datetime import datetime
+from sqlalchemy import text
+from config import TIMESTAMP_INDEX_TYPE, PARTITION_MONTHS_AHEAD
+from models import category_classes
+
+
+def month_start(value: datetime) -> datetime:
+    '''
+        Returns the first instant of the month of a timestamp.
+    '''
+
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value: datetime) -> datetime:
+    '''
+        Returns the first instant of the month following a month start.
+    '''
+
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_name(table_name: str, month: datetime) -> str:
+    return f'{table_name}_p{month:%Y%m}'
+
+
+def is_partitioned(connection, table_name: str) -> bool:
+    '''
+        Checks whether a table exists as a partitioned table.
+    '''
+
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table_name)"), {"table_name": table_name}).scalar()
+
+
+def ensure_partitions(connection, table_name: str, start: datetime, end: datetime):
+    '''
+        Creates the default partition and the monthly partitions covering [start, end] when they do not exist.
+    '''
+
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{table_name}_default" PARTITION OF "{table_name}" DEFAULT'))
+
+    month = month_start(start)
+    while month <= end:
+        connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(table_name, month)}" PARTITION OF "{table_name}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"))
+        month = next_month(month)
+
+
+def ensure_upcoming_partitions(engine):
+    '''
+        Creates the partitions of the current month and of the next PARTITION_MONTHS_AHEAD months for every
+        partitioned table, so new readings never land in the default partition.
+    '''
+
+    now = datetime.utcnow()
+    end = month_start(now)
+    for _ in range(PARTITION_MONTHS_AHEAD):
+        end = next_month(end)
+
+    with engine.begin() as connection:
+        for model in category_classes.values():
+            if is_partitioned(connection, model.__tablename__):
+                ensure_partitions(connection, model.__tablename__, now, end)
+
+
+def drop_partitions_before(engine, cutoff: datetime):
+    '''
+        Retention: drops every monthly partition ending before the cutoff, or deletes the older readings
+        (through the timestamp index) from tables which are not partitioned.
+    '''
+
+    cutoff = month_start(cutoff)
+    with engine.begin() as connection:
+        for model in category_classes.values():
+            table_name = model.__tablename__
+            if not is_partitioned(connection, table_name):
+                connection.execute(text(f'DELETE FROM "{table_name}" WHERE timestamp < :cutoff'), {"cutoff": cutoff})
+                continue
+
+            partitions = connection.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table_name"),
+                {"table_name": table_name}).scalars().all()
+            for partition in partitions:
+                suffix = partition[len(table_name) + 2:]
+                if not partition.startswith(f'{table_name}_p') or not suffix.isdigit():
+                    continue
+                if next_month(datetime.strptime(suffix, '%Y%m')) <= cutoff:
+                    connection.execute(text(f'DROP TABLE "{partition}"'))
+            # readings of older months may still sit in the default partition
+            connection.execute(text(f'DELETE FROM "{table_name}" WHERE timestamp < :cutoff'), {"cutoff": cutoff})
+
+
+def migrate(engine, partitioning: bool):
+    '''
+        Migrates existing tables: creates the timestamp index and, when partitioning is enabled, moves every
+        plain table into a new partitioned table (in one transaction per table).
+    '''
+
+    for model in category_classes.values():
+        table = model.__table__
+        table_name = table.name
+        index_name = f'ix_{table_name}_timestamp'
+
+        with engine.begin() as connection:
+            exists = connection.execute(text("SELECT to_regclass(:table_name) IS NOT NULL"),
+                                        {"table_name": table_name}).scalar()
+            if not exists:
+                table.create(connection)
+                if partitioning:
+                    ensure_partitions(connection, table_name, datetime.utcnow(), datetime.utcnow())
+                continue
+
+            if not partitioning or is_partitioned(connection, table_name):
+                connection.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" USING {TIMESTAMP_INDEX_TYPE} (timestamp)'))
+                continue
+
+            # moving the plain table aside, with its sequence, index and primary key names
+            legacy = f'{table_name}_legacy'
+            connection.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{legacy}"'))
+            connection.execute(text(f'ALTER SEQUENCE IF EXISTS "{table_name}_id_seq" RENAME TO "{legacy}_id_seq"'))
+            connection.execute(text(f'ALTER INDEX IF EXISTS "{index_name}" RENAME TO "ix_{legacy}_timestamp"'))
+            connection.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{table_name}_pkey" TO "{legacy}_pkey"'))
+
+            # creating the partitioned table with partitions covering the existing readings
+            table.create(connection)
+            first, last = connection.execute(text(f'SELECT min(timestamp), max(timestamp) FROM "{legacy}"')).one()
+            now = datetime.utcnow()
+            ensure_partitions(connection, table_name, min(first or now, now), max(last or now, now))
+
+            # copying the readings and continuing the ids where the old table stopped
+            connection.execute(text(
+                f'INSERT INTO "{table_name}" (id, timestamp, power, category) '
+                f'SELECT id, timestamp, power, category FROM "{legacy}"'))
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table_name}\"', 'id'), "
+                f'COALESCE((SELECT max(id) FROM "{table_name}"), 0) + 1, false)'))
+            connection.execute(text(f'DROP TABLE "{legacy}"'))
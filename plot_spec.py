@@ -0,0 +1,81 @@
+'''
+    This script builds plotly figures as plain {"data", "layout"} documents, straight from numpy arrays, instead
+    of going through plotly figure objects and their property validation. The documents are the ones plotly
+    would produce for the same figures and are serialized with orjson
+'''
+
+# Import necessary dependencies
+import numpy as np
+import orjson
+import pandas as pd
+import plotly.io as pio
+
+# default template every plotly figure carries in its layout, converted once
+TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+
+
+def values(data):
+    '''
+        Returns the values of an array-like (series, index, list) in a form orjson serializes like plotly does:
+        numpy arrays, with datetimes as naive ISO 8601 strings and missing values as null.
+    '''
+
+    if isinstance(data, (pd.Series, pd.Index)):
+        if isinstance(data.dtype, pd.DatetimeTZDtype):
+            # aware timestamps keep their offset, like plotly's encoder
+            return [None if pd.isna(value) else value.isoformat() for value in data]
+        data = data.to_numpy()
+    data = np.asarray(data)
+
+    # orjson only serializes contiguous numeric, boolean and datetime arrays
+    if data.dtype.kind in 'OUS' or (data.dtype.kind == 'M' and np.isnat(data).any()):
+        return data.astype('datetime64[us]').tolist() if data.dtype.kind == 'M' else data.tolist()
+    return np.ascontiguousarray(data)
+
+
+def scalar(value):
+    '''
+        Returns a single value (e.g. a timestamp bounding a shape) in a form orjson serializes.
+    '''
+
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def trace(trace_type: str, **props) -> dict:
+    '''
+        Returns a trace of the given type. The x, y and text arrays are converted with `values`.
+    '''
+
+    for name in ('x', 'y', 'text'):
+        if name in props:
+            props[name] = values(props[name])
+    return {**props, 'type': trace_type}
+
+
+def rect(x0, x1, y0, y1, xref: str, yref: str, **props) -> dict:
+    '''
+        Returns a rectangle shape, as added by plotly's add_vrect (yref 'y domain') and add_hrect (xref 'x domain').
+    '''
+
+    return {**props, 'type': 'rect', 'x0': scalar(x0), 'x1': scalar(x1), 'xref': xref,
+            'y0': scalar(y0), 'y1': scalar(y1), 'yref': yref}
+
+
+def figure(data: list, layout: dict) -> dict:
+    '''
+        Returns the document of a figure made of traces and a layout, with the default template.
+    '''
+
+    return {'data': data, 'layout': {'template': TEMPLATE, **layout}}
+
+
+def to_json(spec: dict) -> str:
+    '''
+        Serializes a figure document.
+    '''
+
+    return orjson.dumps(spec, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
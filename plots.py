@@ -1,13 +1,9 @@
-from typing import List, Tuple
 import pandas as pd
-import plotly.express as px
-import plotly
-import json
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import os
 from collections import Counter
-from scipy.stats import linregress
+import numpy as np
+from decimation import decimate
+from plot_spec import trace, rect, scalar, figure
 
 # time_interval_mapping is a dictionary that maps human-readable time intervals to their corresponding string representations.
 time_interval_mapping = {
@@ -25,25 +21,62 @@ month_dict = {1: 'January', 2: 'February', 3: 'March', 4: 'April', 5: 'May', 6:
 day_dict = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday',
             3: 'Thursday', 4: 'Friday', 5: 'Saturday', 6: 'Sunday'}
 
+# plot_names lists the plots generated for a category (see `utils.get_plots`)
+plot_names = [f'{interval}_plot' for interval in time_interval_mapping] + ['weekday_plot', 'night_and_slope_highlighted_plot']
 
-def get_aggregate_plots(data_frame: pd.DataFrame):
 
+def plots_key(category_name: str) -> str:
     '''
-        Generates aggregate plots for power consumption data over different time intervals.
+        Returns the redis key of the hash holding the plots of a category, one field per plot
     '''
 
-    df = data_frame.copy()
-    df.set_index('timestamp', inplace=True)
+    return f'{category_name}_plots'
 
-    def update_trace(button):
-        if button.label == 'Max':
-            return [False, True, False]
-        elif button.label == 'Min':
-            return [False, False, True]
-        elif button.label == 'Average':
-            return [True, False, False]
-        else:
-            return [True, True, True]
+
+def aggregate_plot(state: str, duration_avg: pd.Series, duration_max: pd.Series, duration_min: pd.Series) -> dict:
+
+    '''
+        Generates the aggregate plot (plotly figure document) of one time interval from its average, max and min series.
+    '''
+
+    # the traces of a one cell subplot grid, with the same properties plotly's make_subplots would give them
+    duration_avg_trace = trace('scatter', mode='lines', name=f'{state} Average Power Consumption',
+                               x=duration_avg.index, y=duration_avg.values, xaxis='x', yaxis='y')
+    duration_max_trace = trace('scatter', marker=dict(color='red', size=8), mode='markers',
+                               name=f'{state} Max Power Consumption', x=duration_max.index, y=duration_max.values,
+                               xaxis='x', yaxis='y')
+    duration_min_trace = trace('scatter', marker=dict(color='green', size=8), mode='markers',
+                               name=f'{state} Min Power Consumption', x=duration_min.index, y=duration_min.values,
+                               xaxis='x', yaxis='y')
+
+    buttons = [
+        dict(args=[{'visible': [False, True, False]}], label='Max', method='restyle'),
+        dict(args=[{'visible': [False, False, True]}], label='Min', method='restyle'),
+        dict(args=[{'visible': [True, False, False]}], label='Average', method='restyle'),
+        dict(args=[{'visible': [True, True, True]}], label='All', method='restyle')
+    ]
+
+    layout = dict(
+        xaxis=dict(anchor='y', domain=[0.0, 1.0], title=dict(text="Timestamp")),
+        yaxis=dict(anchor='x', domain=[0.0, 1.0], title=dict(text=f"{state} Power Consumption")),
+        showlegend=True,
+        updatemenus=[dict(buttons=buttons, showactive=True, type='buttons', x=1.2, y=0.6)],
+        height=600,
+    )
+    return figure([duration_avg_trace, duration_max_trace, duration_min_trace], layout)
+
+
+def get_aggregate_plots(data_frame: pd.DataFrame, aggregates: dict = None):
+
+    '''
+        Generates aggregate plots for power consumption data over different time intervals.
+        When `aggregates` (interval -> frame with mean, max and min columns, e.g. built from rollup buckets)
+        is given, the raw readings are not resampled.
+    '''
+
+    if aggregates is None:
+        df = data_frame.copy()
+        df.set_index('timestamp', inplace=True)
 
     plots_json = {}
 
@@ -51,49 +84,22 @@ def get_aggregate_plots(data_frame: pd.DataFrame):
         state = item[0].capitalize()
         symbol = item[1]
 
-        duration_avg = df['power'].resample(symbol).mean()
-        duration_max = df['power'].resample(symbol).max()
-        duration_min = df['power'].resample(symbol).min()
-
-        fig = make_subplots(
-            rows=1, cols=1, shared_xaxes=True, vertical_spacing=0.02)
-
-        duration_avg_trace = go.Scatter(
-            x=duration_avg.index, y=duration_avg.values, mode='lines', name=f'{state} Average Power Consumption')
-        duration_max_trace = go.Scatter(x=duration_max.index, y=duration_max.values, mode='markers',
-                                        name=f'{state} Max Power Consumption', marker=dict(size=8, color='red'))
-        duration_min_trace = go.Scatter(x=duration_min.index, y=duration_min.values, mode='markers',
-                                        name=f'{state} Min Power Consumption', marker=dict(size=8, color='green'))
-
-        fig.add_trace(duration_avg_trace, row=1, col=1)
-        fig.add_trace(duration_max_trace, row=1, col=1)
-        fig.add_trace(duration_min_trace, row=1, col=1)
-
-        buttons = [
-            dict(label='Max', method='restyle', args=[
-                 {'visible': [False, True, False]}]),
-            dict(label='Min', method='restyle', args=[
-                 {'visible': [False, False, True]}]),
-            dict(label='Average', method='restyle', args=[
-                 {'visible': [True, False, False]}]),
-            dict(label='All', method='restyle', args=[
-                 {'visible': [True, True, True]}])
-        ]
-
-        fig.update_xaxes(title_text="Timestamp", row=1, col=1)
-        fig.update_yaxes(title_text=f"{state} Power Consumption", row=1, col=1)
-        fig.update_layout(showlegend=True, updatemenus=[dict(
-            type='buttons', showactive=True, buttons=buttons, x=1.20, y=0.6)], height=600)
-        graphJSON = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+        if aggregates is not None:
+            duration = aggregates[item[0]]
+        else:
+            # a single resample pass computes the three aggregates
+            duration = df['power'].resample(symbol).agg(['mean', 'max', 'min'])
+
+        graphJSON = aggregate_plot(state, duration['mean'], duration['max'], duration['min'])
         plots_json[state.lower()+"_plot"] = graphJSON
 
     return plots_json
 
 
-def get_weekday_plots(data_frame: pd.DataFrame):
+def weekday_means(data_frame: pd.DataFrame) -> pd.Series:
 
     '''
-        Generates plots depicting power consumption trends for each day of the week across different months and years.
+        Computes the mean of the daily average power per (year, month, day of week), Monday being 0.
     '''
 
     df = data_frame.copy()
@@ -108,163 +114,179 @@ def get_weekday_plots(data_frame: pd.DataFrame):
     power_device.day.astype('int')
     power_device.month.astype('int')
     power_device.power.astype('float')
-    group_mean = power_device.groupby(['year', 'month', 'day']).power.mean()
-
-    year_dict = Counter()
-    for item in group_mean.index:
-        year_dict[item[0]] = Counter()
-    for year in year_dict.keys():
-        for month in range(1, 13):
-            year_dict[year][month] = Counter()
-    for item in zip(group_mean.index, group_mean.values):
-        year_dict[item[0][0]][item[0][1]][item[0][2]] = round(item[1], 2)
-
-    plots_month_wise = Counter()
-    for year in year_dict.keys():
-        plots_month_wise[year] = Counter()
-    for year in year_dict.keys():
-        if (len(year_dict[year].keys()) == 0):
-            continue
-        for i in range(1, 13):
-            plotable_dict = year_dict[year][i]
-            if len(plotable_dict.keys()) == 0:
-                continue
-
-            plotable_dict = {
-                'day_name': [day_dict[x] for x in range(0, 7)],
-                'power': [0 if x not in plotable_dict else plotable_dict[x] for x in range(0, 7)]
-            }
-
-            printer_daywise_df = pd.DataFrame(plotable_dict)
-            fig = px.bar(
-                printer_daywise_df,
-                x='day_name',
-                y='power',
-                text='power',
-                title=f'{month_dict[i]}, {year}',
-            )
-
-            fig.update_xaxes(title_text='Day Of Weeks')
-            fig.update_yaxes(title_text='Power (W)')
-            graphJSON = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-            plots_month_wise[year][month_dict[i]] = graphJSON
-    plot_json = {"weekday_plot": plots_month_wise}
-    return plot_json
-
-
-def night_time_zones(df: pd.DataFrame, timestamp_col: str = 'timestamp', start: int = 20, end: int = 6) -> tuple[
-    tuple[int, int], ...]:
-    """
-    Returns a list of tuples containing the integer location of start and end of nighttime zones in the dataframe
-    """
-    flag = 0  # 0 for start 1 for end
-    night_zones: List[Tuple[int, int]] = []  # To store the zones
-    start_end = [0, 0]  # Start and end of the zones
+    return power_device.groupby(['year', 'month', 'day']).power.mean()
 
-    # Iterating through each rows
-    for i, time in enumerate(df[timestamp_col].dt.hour.to_numpy()):
 
-        # Set the start of the zone if the time is greater than or equal to start time and flag is not set
-        if time >= start and not flag:
-            start_end[0] = i  # Set the start of the zone
-            flag = 1  # Set the flag to indicate that start is set
+def weekday_pivot(group_mean: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
 
-        # Set the end of the zone if the time is less than end time and flag is set
-        elif time < end and flag:
-            start_end[1] = i  # Set the end of the zone
-            night_zones.append(tuple(start_end))  # Append the zone to the list
-            start_end = [0, 0]  # Reset the start and end
-            flag = 0  # Reset the flag
+    '''
+        Pivots the (year, month, day) means into an array of shape (years, 12, 7) and returns the years of its first
+        axis along with it, and the mask of the (year, month, day) entries present in the means. A mean can be present
+        and NaN (days without readings, e.g. in a gap), it is NaN as well where there is no entry.
+    '''
 
-    return tuple(night_zones)
+    years_of_mean = group_mean.index.get_level_values(0).to_numpy().astype(int)
+    years = np.unique(years_of_mean)
+    means = np.full((years.size, 12, 7), np.nan)
+    present = np.zeros((years.size, 12, 7), dtype=bool)
+    position = (np.searchsorted(years, years_of_mean),
+                group_mean.index.get_level_values(1).to_numpy().astype(int) - 1,
+                group_mean.index.get_level_values(2).to_numpy().astype(int))
+    means[position] = group_mean.to_numpy(dtype=float)
+    present[position] = True
+    return years, means, present
 
 
-def positive_slope_zones(df: pd.DataFrame, use_col: str, dist_to_check=5, min_slope=1) -> tuple[tuple[int, int], ...]:
-    """
-    Returns a list of tuples containing the integer location of start and end of positive slope zones in the dataframe
-    """
-    pos_slope_zone = []  # Value to store the negative slope zone
+def weekday_month_plot(year: int, month: int, means, present) -> dict:
 
-    start = ...  # Start of the zone
+    '''
+        Generates the plot of the mean power per day of the week of one month from its 7 means (Monday first) and the
+        mask of the ones present, absent days being drawn as 0 and NaN means as no bar (null).
+    '''
 
-    # Iterating through each rows
-    for j in range(len(df.index)):
-        indi = j  # Index of the current row
+    means = np.round(np.asarray(means, dtype=float), 2)
+    power = np.where(np.asarray(present, dtype=bool), means, 0.0)
+
+    # the bar chart plotly express would build for the day_name and power columns
+    bar_trace = trace('bar', alignmentgroup='True', hovertemplate='day_name=%{x}<br>power=%{text}<extra></extra>',
+                      legendgroup='', marker=dict(color='#636efa', pattern=dict(shape='')), name='',
+                      offsetgroup='', orientation='v', showlegend=False, text=power,
+                      textposition='auto', x=[day_dict[x] for x in range(0, 7)], xaxis='x', y=power,
+                      yaxis='y')
+    layout = dict(
+        xaxis=dict(anchor='y', domain=[0.0, 1.0], title=dict(text='Day Of Weeks')),
+        yaxis=dict(anchor='x', domain=[0.0, 1.0], title=dict(text='Power (W)')),
+        legend=dict(tracegroupgap=0),
+        title=dict(text=f'{month_dict[month]}, {year}'),
+        barmode='relative',
+    )
+    return figure([bar_trace], layout)
 
-        # Left Value
-        if j != 0:
-            left = df.iloc[j - 1][use_col]
-        else:
-            left = df.iloc[j][use_col]
 
-        current = df.iloc[j][use_col]  # Current Value
-        # Next value is assigned after next If Statement to avoid the Index Out of Bound Error
+def get_weekday_plots(data_frame: pd.DataFrame, group_mean: pd.Series = None):
 
-        # Consider the end of the zone as maxima or not by comparing it with its previous value
-        if j == df.shape[0] - 1:
-            if current > left:
-                pos_slope_zone.append((start, indi))
-            continue
+    '''
+        Generates plots depicting power consumption trends for each day of the week across different months and years.
+        The (year, month, day) means can be passed precomputed (e.g. aggregated by the database) instead of the readings.
+    '''
 
-        right = df.iloc[j + 1][use_col]  # Next Value
+    if group_mean is None:
+        group_mean = weekday_means(data_frame)
+    years, means, present = weekday_pivot(group_mean)
 
-        # Consider the start of the zone as minima or not by comparing it with its next value
-        if j == 0:
-            # Compare only with the next value
-            if current <= right:
-                start = indi
-            continue
+    # one plot per month with at least one entry, even if all of its means are NaN
+    plots_month_wise = Counter()
+    for position, year in enumerate(years.tolist()):
+        plots_month_wise[year] = Counter()
+        for month in (np.flatnonzero(present[position].any(axis=1)) + 1).tolist():
+            plots_month_wise[year][month_dict[month]] = weekday_month_plot(
+                year, month, means[position, month - 1], present[position, month - 1])
+    plot_json = {"weekday_plot": plots_month_wise}
+    return plot_json
 
-        # Assign a point as minima if it's lower than both of left and right point
-        if current <= left and current < right:
-            start = indi
-            continue
 
-        # Assign a point as maxima if it's higher than both of left and right point
-        if current > left and current >= right:
-            pos_slope_zone.append([start, indi])
-            continue
+def night_time_zones(df: pd.DataFrame, timestamp_col: str = 'timestamp', start: int = 20, end: int = 6,
+                     tz: str = None) -> tuple[tuple[int, int], ...]:
+    """
+    Returns a list of tuples containing the integer location of start and end of nighttime zones in the dataframe.
+    A zone starts at the first row whose hour is at least `start` and ends at the next row whose hour is below `end`.
+    When `tz` is given the hours are taken in that timezone (naive timestamps are considered UTC)
+    """
+    if start < end:
+        raise ValueError("The night window must wrap around midnight (start >= end)")
 
-    # Merge two pairs which belongs to same slope but seperated due to a flat line or some noise in between
-    i = 0  # counter
+    timestamps = df[timestamp_col]
+    if tz is not None:
+        if timestamps.dt.tz is None:
+            timestamps = timestamps.dt.tz_localize('UTC')
+        timestamps = timestamps.dt.tz_convert(tz)
+    hours = timestamps.dt.hour.to_numpy()
 
-    # Iterate through each zone
-    while i < len(pos_slope_zone) - 1:
+    # Rows which may start a zone and rows which may end one (the two windows are disjoint)
+    is_start = hours >= start
+    events = np.flatnonzero(is_start | (hours < end))
+    is_start_event = is_start[events]
 
-        # If the distance between the end of the first zone and the start of the second zone is less than dist_to_check
-        # and the value at the end of the first zone is lesser than the value at the start of the second zone
-        if (pos_slope_zone[i + 1][0] - pos_slope_zone[i][1] <= dist_to_check and
-                df[use_col].iloc[pos_slope_zone[i + 1][0]] >= df[use_col].iloc[pos_slope_zone[i][1]]):
-            # Merge the two zones
-            pos_slope_zone[i][1] = pos_slope_zone[i + 1][1]
-            pos_slope_zone.pop(i + 1)
+    # Ends seen before the first start are ignored
+    first_start = np.argmax(is_start_event) if is_start_event.any() else events.size
+    events, is_start_event = events[first_start:], is_start_event[first_start:]
 
-            # Decrement the counter to check the merged zone with the next zone
-            i -= 1
+    # Only the first row of each run of starts (resp. ends) opens (resp. closes) a zone
+    run_heads = np.ones(events.size, dtype=bool)
+    run_heads[1:] = is_start_event[1:] != is_start_event[:-1]
+    zone_starts = events[run_heads & is_start_event]
+    zone_ends = events[run_heads & ~is_start_event]
 
-        i += 1
+    # A zone still open at the end of the data is dropped
+    return tuple(zip(zone_starts[:zone_ends.size].tolist(), zone_ends.tolist()))
 
-    # Remove zones with slope less than min_slope
-    if min_slope:
 
-        # Iterate through each zone
-        i = 0  # counter
-        while i < len(pos_slope_zone) - 1:
+def _zone_slopes(x: np.ndarray, y: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Returns the least squares slope of y against x over each inclusive [start, end] zone
+    """
+    lengths = ends - starts + 1
+    zone = np.repeat(np.arange(starts.size), lengths)
 
-            # Calculate the slope of the zone
-            slope = linregress(df.iloc[pos_slope_zone[i][0]:pos_slope_zone[i][1] + 1].index,
-                               df[use_col].iloc[pos_slope_zone[i][0]:pos_slope_zone[i][1] + 1])[0]
+    # Integer locations of every point of every zone, laid out zone after zone
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.repeat(starts, lengths) + offsets
+    zone_x, zone_y = x[positions], y[positions]
 
-            # If the slope is less than min_slope, remove the zone
-            if slope < min_slope:
-                pos_slope_zone.pop(i)
+    # Centre each zone on its own mean before summing so long series do not lose precision
+    mean_x = np.bincount(zone, weights=zone_x) / lengths
+    mean_y = np.bincount(zone, weights=zone_y) / lengths
+    dx = zone_x - mean_x[zone]
+    dy = zone_y - mean_y[zone]
 
-                # Decrement the counter to check the next zone
-                i -= 1
+    return np.bincount(zone, weights=dx * dy) / np.bincount(zone, weights=dx * dx)
 
-            i += 1
 
-    return tuple(pos_slope_zone)
+def positive_slope_zones(df: pd.DataFrame, use_col: str, dist_to_check=5, min_slope=1) -> tuple[tuple[int, int], ...]:
+    """
+    Returns a list of tuples containing the integer location of start and end of positive slope zones in the dataframe
+    """
+    values = df[use_col].to_numpy(dtype=float)
+    n = values.size
+
+    # A zone needs at least two points
+    if n < 2:
+        return ()
+
+    left, current, right = values[:-2], values[1:-1], values[2:]
+
+    # Minima: the first point if it is not higher than the next one, and points lower than both of their neighbours
+    is_minima = np.zeros(n, dtype=bool)
+    is_minima[0] = values[0] <= values[1]
+    is_minima[1:-1] = (current <= left) & (current < right)
+
+    # Maxima: points higher than both of their neighbours, and the last point if it is higher than the previous one
+    is_maxima = np.zeros(n, dtype=bool)
+    is_maxima[1:-1] = (current > left) & (current >= right)
+    is_maxima[-1] = values[-1] > values[-2]
+
+    # Every maxima closes a zone which starts at the last minima before it
+    minima = np.flatnonzero(is_minima)
+    maxima = np.flatnonzero(is_maxima)
+    previous = np.searchsorted(minima, maxima) - 1
+    starts = minima[previous[previous >= 0]]
+    ends = maxima[previous >= 0]
+
+    # Merge two pairs which belongs to same slope but seperated due to a flat line or some noise in between:
+    # the distance between the end of a zone and the start of the next one is at most dist_to_check
+    # and the value at the end of the zone is not greater than the value at the start of the next one
+    if starts.size > 1:
+        join = (starts[1:] - ends[:-1] <= dist_to_check) & (values[starts[1:]] >= values[ends[:-1]])
+        starts = starts[np.concatenate(([True], ~join))]
+        ends = ends[np.concatenate((~join, [True]))]
+
+    # Remove zones with slope less than min_slope (the last zone is always kept)
+    if min_slope and starts.size > 1:
+        slopes = _zone_slopes(np.asarray(df.index, dtype=float), values, starts[:-1], ends[:-1])
+        keep = np.concatenate((~(slopes < min_slope), [True]))
+        starts, ends = starts[keep], ends[keep]
+
+    return tuple(zip(starts.tolist(), ends.tolist()))
 
 def get_stats(df: pd.DataFrame, use_col: str) -> list[float]:
     """
@@ -287,7 +309,7 @@ def get_stats(df: pd.DataFrame, use_col: str) -> list[float]:
 
 
 def get_night_and_slope_highlight_plot(dataframe: pd.DataFrame, time_col: str = 'timestamp', power_col: str = 'power', title='Power (W)',
-                     start=20, end=6, dist_to_check=5, min_slope=5) -> str:
+                     start=20, end=6, dist_to_check=5, min_slope=5, tz=None, max_points=None, decimation='lttb') -> dict:
     """
     Creates a line plot with night zones and positive slope zones highlighted
     :param df:  The dataframe
@@ -298,21 +320,24 @@ def get_night_and_slope_highlight_plot(dataframe: pd.DataFrame, time_col: str =
     :param end:  end time of the night zone
     :param dist_to_check:  distance to check for positive slope
     :param min_slope:  minimum slope to consider as positive slope
+    :param tz:  timezone in which the night zone is evaluated
+    :param max_points:  maximum number of points drawn for the power line (all points when None)
+    :param decimation:  downsampling method used above max_points, 'lttb' or 'minmax'
 
-    :return: the html string of the plot
+    :return: the figure document of the plot
     """
 
     df = dataframe.copy()
 
     # Figure Layout
-    layout = go.Layout(
-        title=title,
+    layout = dict(
+        title=dict(text=title),
         plot_bgcolor="#FFF",
         hovermode="x",
         hoverdistance=100,  # Distance to show hover label of data point
         spikedistance=1000,  # Distance to show spike# Sets background color to white
         xaxis=dict(
-            title="Time",
+            title=dict(text="Time"),
             linecolor="#BCCCDC",  # Sets color of X-axis line
             showgrid=False,
             showspikes=True,  # Show spike line for X-axis
@@ -322,46 +347,59 @@ def get_night_and_slope_highlight_plot(dataframe: pd.DataFrame, time_col: str =
             spikecolor="#999999",
             spikemode="across",
         ),  # Removes X-axis grid lines
-        yaxis=dict(title="Power (W)", linecolor="#BCCCDC"),  # Sets color of Y-axis line
+        yaxis=dict(title=dict(text="Power (W)"), linecolor="#BCCCDC"),  # Sets color of Y-axis line
         showlegend=False,
     )
 
+    # Points drawn for the line plot, zones below are still computed on every reading
+    if max_points and len(df.index) > max_points:
+        kept = decimate(df[time_col].to_numpy().astype('datetime64[ns]').astype(np.int64),
+                        df[power_col].to_numpy(), max_points, decimation)
+    else:
+        kept = np.arange(len(df.index))
+
     # Plot the line plot
-    fig = go.Figure(go.Scatter(x=df[time_col], y=df[power_col], name=title), layout=layout)
+    traces = [trace('scatter', name=title, x=df[time_col].iloc[kept], y=df[power_col].iloc[kept])]
+    shapes, annotations = [], []
 
     # Add the night zones
-    night_zones = night_time_zones(df, timestamp_col=time_col, start=start, end=end)  # Get the night zones
+    night_zones = night_time_zones(df, timestamp_col=time_col, start=start, end=end, tz=tz)  # Get the night zones
     for start, end in night_zones:
-        fig.add_vrect(x0=df[time_col][start], x1=df[time_col][end], annotation_text="Night", fillcolor='purple',
-                      opacity=0.2,
-                      annotation_position="top left", annotation=dict(font_size=20, font_family="Times New Roman"))
+        shapes.append(rect(df[time_col][start], df[time_col][end], 0, 1, xref='x', yref='y domain',
+                           fillcolor='purple', opacity=0.2))
+        annotations.append(dict(font=dict(family="Times New Roman", size=20), showarrow=False, text="Night",
+                                x=scalar(df[time_col][start]), xanchor='left', xref='x', y=1, yanchor='top',
+                                yref='y domain'))
 
     # Add the positive slope zones
     zones = positive_slope_zones(df, use_col=power_col, dist_to_check=dist_to_check,
                                                       min_slope=min_slope)  # Get the positive slope zones
     for start, end in zones:
-        positive_slope_df = df.iloc[start:end + 1]
-        fig.add_trace(go.Scatter(x=positive_slope_df[time_col],
-                                 y=positive_slope_df[power_col],
-                                 mode='lines',
-                                 line=dict(color='red'),
-                                 hoverinfo='skip',
-                                 showlegend=False))
+        # the highlight follows the drawn points and always reaches the exact ends of the zone
+        positive_slope_df = df.iloc[np.union1d(kept[(kept >= start) & (kept <= end)], [start, end])]
+        traces.append(trace('scatter',
+                            hoverinfo='skip',
+                            line=dict(color='red'),
+                            mode='lines',
+                            showlegend=False,
+                            x=positive_slope_df[time_col],
+                            y=positive_slope_df[power_col]))
 
     # Color the box for the zones
     y_values = get_stats(df, use_col=power_col)
     colors = ['green', 'yellow', 'orange', 'red']
     for i in range(0, 4):
-        fig.add_hrect(y0=y_values[i],
-                      y1=y_values[i + 1],
-                      fillcolor=colors[i],
-                      opacity=0.2,
-                      layer="below",
-                      )
-        
+        shapes.append(rect(0, 1, y_values[i], y_values[i + 1], xref='x domain', yref='y',
+                           fillcolor=colors[i], layer="below", opacity=0.2))
+
+    if shapes:
+        layout['shapes'] = shapes
+    if annotations:
+        layout['annotations'] = annotations
+
     # Return the figure
     plot_json = {}
-    graphJSON = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    graphJSON = figure(traces, layout)
     plot_json['night_and_slope_highlighted_plot'] = graphJSON
     return plot_json
 
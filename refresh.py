@@ -0,0 +1,90 @@
+'''
+    This script provides the background refresh of plots and statistics. Inserts only mark their category as dirty,
+    and a worker thread recomputes every dirty category at most once per refresh interval
+'''
+
+# Import necessary dependencies
+import threading
+import time
+from config import REFRESH_INTERVAL
+from init_redis import refreshCategory
+
+
+class RefreshWorker:
+
+    """
+    Coalescing refresh worker.
+
+    Any number of `mark_dirty` calls for a category between two refreshes results in a single
+    `refreshCategory` call, and a category is never refreshed twice within `interval` seconds.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL, refresh=refreshCategory):
+        self.interval = interval
+        self.refresh = refresh
+        self._dirty = set()
+        self._last_refresh = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def mark_dirty(self, category_name: str):
+        """
+        Schedules a refresh of the category
+        """
+        with self._condition:
+            self._dirty.add(category_name)
+            self._condition.notify()
+
+    def pending(self) -> int:
+        """
+        Returns the number of categories waiting for a refresh
+        """
+        with self._condition:
+            return len(self._dirty)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='refresh-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _next_batch(self) -> list:
+        # wait until at least one dirty category is due, then take every due category out of the dirty set
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                due_at = {category: self._last_refresh.get(category, -self.interval) + self.interval
+                          for category in self._dirty}
+                ready = [category for category, due in due_at.items() if due <= now]
+                if ready:
+                    self._dirty.difference_update(ready)
+                    return ready
+                timeout = min(due_at.values()) - now if due_at else None
+                self._condition.wait(timeout)
+            return []
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            for category_name in batch:
+                self._last_refresh[category_name] = time.monotonic()
+                try:
+                    self.refresh(category_name)
+                except Exception as e:
+                    print(f"Failed to refresh '{category_name}': {str(e)}")
+
+
+# worker shared by the routes and started with the application
+refresh_worker = RefreshWorker()
@@ -0,0 +1,155 @@
+'''
+    This script computes hourly, daily, weekly and monthly rollup buckets (sum, count, min, max) of power
+    consumption. Buckets are labelled exactly like pandas resampling does, so the aggregate plots built from
+    them match the ones built by resampling the raw readings
+'''
+
+# Import necessary dependencies
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from plots import time_interval_mapping
+
+# Lua script that folds a partial aggregate "sum count min max" into a single bucket of a rollup hash atomically
+UPDATE_BUCKET_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+local total, count, minimum, maximum = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+if current then
+    local parts = {}
+    for part in string.gmatch(current, '%S+') do
+        table.insert(parts, tonumber(part))
+    end
+    total = total + parts[1]
+    count = count + parts[2]
+    minimum = math.min(minimum, parts[3])
+    maximum = math.max(maximum, parts[4])
+end
+redis.call('HSET', KEYS[1], ARGV[1], string.format('%.17g %.17g %.17g %.17g', total, count, minimum, maximum))
+return 1
+"""
+
+
+def rollup_key(category_name: str, interval: str) -> str:
+    '''
+        Returns the redis key of the rollup hash of a category for an interval (hourly, daily, weekly, monthly)
+    '''
+
+    return f'{category_name}_rollup_{interval}'
+
+
+def bucket_label(timestamp: datetime, interval: str) -> datetime:
+    '''
+        Returns the label of the bucket a timestamp falls into, following pandas resample labels.
+    '''
+
+    # timestamps are stored without timezone, so aware timestamps are converted to UTC first
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    symbol = time_interval_mapping[interval]
+
+    if symbol == 'H':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if symbol == 'D':
+        return day
+    if symbol == 'W':
+        # weeks end on sunday and are labelled by it
+        return day + timedelta(days=6 - day.weekday())
+    # months are labelled by their last day
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def bucket_labels(timestamps: pd.Series, interval: str) -> pd.Series:
+    '''
+        Vectorized version of bucket_label for a series of naive timestamps.
+    '''
+
+    symbol = time_interval_mapping[interval]
+    day = timestamps.dt.normalize()
+
+    if symbol == 'H':
+        return timestamps.dt.floor('H')
+    if symbol == 'D':
+        return day
+    if symbol == 'W':
+        return day + pd.to_timedelta(6 - timestamps.dt.dayofweek, unit='D')
+    return timestamps.dt.to_period('M').dt.to_timestamp(how='end').dt.normalize()
+
+
+def compute_rollups(data_frame: pd.DataFrame) -> dict:
+    '''
+        Computes the rollup buckets (sum, count, min, max) of every interval from raw readings.
+    '''
+
+    df = data_frame[['timestamp', 'power']].dropna()
+    rollups = {}
+    for interval in time_interval_mapping:
+        labels = bucket_labels(df['timestamp'], interval)
+        rollups[interval] = df['power'].groupby(labels).agg(['sum', 'count', 'min', 'max'])
+    return rollups
+
+
+def merge_rollups(rollups: dict, other: dict) -> dict:
+    '''
+        Merges two sets of rollup buckets into one.
+    '''
+
+    merged = {}
+    for interval in time_interval_mapping:
+        left, right = rollups.get(interval), other.get(interval)
+        if left is None or left.empty:
+            merged[interval] = right
+            continue
+        if right is None or right.empty:
+            merged[interval] = left
+            continue
+        both = pd.concat([left, right]).groupby(level=0)
+        merged[interval] = pd.DataFrame({
+            'sum': both['sum'].sum(),
+            'count': both['count'].sum(),
+            'min': both['min'].min(),
+            'max': both['max'].max(),
+        })
+    return merged
+
+
+def encode_bucket(total: float, count: float, minimum: float, maximum: float) -> str:
+    '''
+        Encodes a bucket in the "sum count min max" format stored in the rollup hashes.
+    '''
+
+    return f'{float(total)!r} {float(count)!r} {float(minimum)!r} {float(maximum)!r}'
+
+
+def decode_rollup(fields: dict) -> pd.DataFrame:
+    '''
+        Decodes the fields of a rollup hash into a frame of buckets indexed by label.
+    '''
+
+    labels = [pd.Timestamp(label.decode('utf-8') if isinstance(label, bytes) else label) for label in fields]
+    values = [[float(part) for part in value.split()] for value in fields.values()]
+    buckets = pd.DataFrame(values, index=pd.DatetimeIndex(labels), columns=['sum', 'count', 'min', 'max'])
+    return buckets.sort_index()
+
+
+def to_aggregates(rollups: dict) -> dict:
+    '''
+        Converts rollup buckets into the mean, max and min series plotted by `plots.aggregate_plot`.
+        Empty buckets in between are kept as gaps, like resample does.
+    '''
+
+    aggregates = {}
+    for interval, buckets in rollups.items():
+        symbol = time_interval_mapping[interval]
+        if buckets is None or buckets.empty:
+            aggregates[interval] = pd.DataFrame(columns=['mean', 'max', 'min'], dtype=float)
+            continue
+        index = pd.date_range(buckets.index[0], buckets.index[-1], freq=symbol, name='timestamp')
+        frame = pd.DataFrame({
+            'mean': buckets['sum'] / buckets['count'],
+            'max': buckets['max'],
+            'min': buckets['min'],
+        })
+        aggregates[interval] = frame.reindex(index)
+    return aggregates
@@ -0,0 +1,249 @@
+'''
+    This script maintains running statistics of power consumption so that they can be updated point by point
+    instead of rescanning the whole table on every insert
+'''
+
+# Import necessary dependencies
+import math
+import numpy as np
+import pandas as pd
+
+# relative accuracy guaranteed by the quantile sketch for percentiles and median
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+
+class QuantileSketch:
+
+    """
+    Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Every value is mapped to a logarithmically sized bucket, so any quantile estimate is within
+    `relative_accuracy` of the true value. Updates are O(1) and two sketches with the same accuracy
+    are merged by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}  # bucket key -> count for values > 0
+        self.negative = {}  # bucket key -> count for values < 0 (keyed by absolute value)
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float):
+        """
+        Adds a single value to the sketch
+        """
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+
+    def add_many(self, values: np.ndarray):
+        """
+        Adds an array of values to the sketch in one vectorized pass
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+
+        for store, selected in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            if selected.size == 0:
+                continue
+            keys, counts = np.unique(np.ceil(np.log(selected) / self.log_gamma).astype(np.int64), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                store[key] = store.get(key, 0) + count
+
+        self.zero_count += int(np.count_nonzero(values == 0))
+        self.count += int(values.size)
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        Merges another sketch built with the same accuracy into this one
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the estimated value at quantile q (0 <= q <= 1)
+        """
+        if self.count == 0:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        seen = 0
+
+        # negative values from the most negative to the closest to zero
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+
+        return self._value(max(self.positive))
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": {str(key): count for key, count in self.positive.items()},
+            "negative": {str(key): count for key, count in self.negative.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuantileSketch':
+        sketch = cls(data["relative_accuracy"])
+        sketch.positive = {int(key): count for key, count in data["positive"].items()}
+        sketch.negative = {int(key): count for key, count in data["negative"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        return sketch
+
+
+class RunningStatistics:
+
+    """
+    Running aggregate of a power consumption series.
+
+    Keeps the count, Welford mean and sum of squared deviations, min, max and a quantile sketch,
+    which is everything needed to answer `utils.get_stats` without looking at the raw readings again.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def update(self, value: float):
+        """
+        Folds a single reading into the aggregate in O(1)
+        """
+        value = float(value)
+        if math.isnan(value):
+            return
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def update_many(self, values):
+        """
+        Folds a batch of readings into the aggregate
+        """
+        batch = RunningStatistics.from_series(pd.Series(values, dtype=float))
+        self.merge(batch)
+
+    def merge(self, other: 'RunningStatistics'):
+        """
+        Merges another aggregate into this one (Chan et al. parallel variance)
+        """
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def to_stats(self) -> dict:
+        """
+        Returns the statistics in the same shape as `utils.get_stats`
+        """
+        if self.count == 0:
+            nan = math.nan
+            return {"count": 0.0, "mean": nan, "std": nan, "min": nan, "percentile_25": nan,
+                    "percentile_50": nan, "percentile_75": nan, "max": nan, "median": nan}
+
+        # keep the sketch estimates inside the exact bounds
+        def quantile(q):
+            return float(min(max(self.sketch.quantile(q), self.min), self.max))
+
+        median = quantile(0.5)
+        return {
+            "count": float(self.count),
+            "mean": float(self.mean),
+            "std": math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan,
+            "min": float(self.min),
+            "percentile_25": quantile(0.25),
+            "percentile_50": median,
+            "percentile_75": quantile(0.75),
+            "max": float(self.max),
+            "median": median
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RunningStatistics':
+        running = cls()
+        running.count = data["count"]
+        running.mean = data["mean"]
+        running.m2 = data["m2"]
+        running.min = data["min"] if data["min"] is not None else math.inf
+        running.max = data["max"] if data["max"] is not None else -math.inf
+        running.sketch = QuantileSketch.from_dict(data["sketch"])
+        return running
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> 'RunningStatistics':
+        """
+        Builds the aggregate from a full series, used to bootstrap the running state
+        """
+        values = series.dropna().to_numpy(dtype=float)
+        running = cls()
+        if values.size == 0:
+            return running
+
+        running.count = int(values.size)
+        running.mean = float(values.mean())
+        running.m2 = float(((values - running.mean) ** 2).sum())
+        running.min = float(values.min())
+        running.max = float(values.max())
+        running.sketch.add_many(values)
+        return running
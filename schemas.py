@@ -3,8 +3,9 @@
 '''
 
 # Import necessary dependencies
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, validator
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
 # Signup Schema to validate signup request
 class SignUpSchema(BaseModel):
@@ -41,6 +42,13 @@ class PowerConsumptionSchema(BaseModel):
     power: float
     category: str
 
+    # timestamps are stored without timezone, so aware timestamps are converted to UTC
+    @validator('timestamp')
+    def timestamp_to_utc(cls, value):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
     class Config:
         schema_extra = {
             'example': {
@@ -61,6 +69,33 @@ class ResponseSchema(BaseModel):
             }
         }
 
+# Define schema for Response of a batch insert
+class BatchResponseSchema(BaseModel):
+    message: str
+    counts: Dict[str, int]
+
+    class Config:
+        schema_extra = {
+            'example': {
+                "message": "Data added successfully",
+                "counts": {"printer3d": 120, "fridge": 45}
+            }
+        }
+
+# Define schema for the status of a csv analysis job
+class JobSchema(BaseModel):
+    job_id: str
+    status: str
+    detail: Optional[str] = None
+
+    class Config:
+        schema_extra = {
+            'example': {
+                "job_id": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "status": "queued"
+            }
+        }
+
 # Define schema for SignUp Response
 class SignUpResponseSchema(BaseModel):
     id: int
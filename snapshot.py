@@ -0,0 +1,179 @@
+'''
+    This script keeps a local columnar snapshot of every category table as Arrow IPC segment files. Segments are
+    memory-mapped on read, and only the rows inserted since the last snapshot (the id watermark) are fetched from
+    PostgreSQL and appended as a new segment
+'''
+
+# Import necessary dependencies
+import os
+import re
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from sqlalchemy import text
+from config import SNAPSHOT_DIR, SNAPSHOT_ENABLED, SNAPSHOT_MAX_SEGMENTS, SNAPSHOT_ID_LOOKBACK
+
+# pyarrow is optional, tables are read from PostgreSQL without it
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+# fcntl is only available on POSIX systems, snapshots are then only locked within a process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# segment files are named after the first and last id they hold
+segment_pattern = re.compile(r'^segment-(\d+)-(\d+)\.arrow$')
+
+# columns of the tables, in the order returned by pd.read_sql_table
+columns = ['id', 'timestamp', 'power', 'category']
+
+# one lock per category so concurrent refreshes do not append the same rows twice. Threads of a process take
+# it before the lock file shared with the other processes (server workers, init_redis.py)
+locks = {}
+locks_guard = threading.Lock()
+
+
+def snapshots_enabled() -> bool:
+    return SNAPSHOT_ENABLED and pa is not None
+
+
+@contextmanager
+def category_lock(category_name: str):
+    with locks_guard:
+        lock = locks.setdefault(category_name, threading.Lock())
+
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        directory = snapshot_path(category_name)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def snapshot_path(category_name: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, category_name)
+
+
+def list_segments(category_name: str) -> list:
+    '''
+        Returns the (first id, last id, path) of the segments of a category, in id order.
+    '''
+
+    directory = snapshot_path(category_name)
+    if not os.path.isdir(directory):
+        return []
+
+    segments = []
+    for name in os.listdir(directory):
+        match = segment_pattern.match(name)
+        if match:
+            segments.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_segments(segments: list) -> pd.DataFrame:
+    '''
+        Reads segment files through memory maps into one frame.
+    '''
+
+    if not segments:
+        return pd.DataFrame(columns=columns)
+
+    tables = []
+    for _, _, path in segments:
+        with pa.memory_map(path, 'r') as source:
+            tables.append(ipc.open_file(source).read_all())
+    df = pa.concat_tables(tables).to_pandas()
+
+    # segments of late committed rows overlap the id range of the others, and segments written concurrently
+    # before snapshots were locked across processes may hold the same rows
+    if not df['id'].is_monotonic_increasing:
+        df = df.sort_values('id', kind='stable', ignore_index=True)
+    if not df['id'].is_unique:
+        df = df.drop_duplicates('id', keep='last', ignore_index=True)
+    return df
+
+
+def write_segment(category_name: str, df: pd.DataFrame) -> tuple:
+    '''
+        Writes rows (sorted by id) as a new segment, atomically. Returns the segment description.
+    '''
+
+    directory = snapshot_path(category_name)
+    os.makedirs(directory, exist_ok=True)
+    first, last = int(df['id'].iloc[0]), int(df['id'].iloc[-1])
+    path = os.path.join(directory, f'segment-{first:012d}-{last:012d}.arrow')
+    temporary = f'{path}.{os.getpid()}.tmp'
+
+    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+    with pa.OSFile(temporary, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary, path)
+    return first, last, path
+
+
+def read_delta(engine, table_name: str, since_id: int) -> pd.DataFrame:
+    '''
+        Fetches the rows of a table whose id is above since_id, in id order.
+    '''
+
+    query = text(f'SELECT id, timestamp, power, category FROM "{table_name}" WHERE id > :since_id ORDER BY id')
+    return pd.read_sql(query, engine, params={'since_id': since_id})
+
+
+def reset_snapshot(category_name: str):
+    '''
+        Deletes the snapshot of a category, e.g. after readings were deleted from the table.
+    '''
+
+    with category_lock(category_name):
+        for _, _, path in list_segments(category_name):
+            os.remove(path)
+
+
+def load_snapshot(engine, category_name: str) -> pd.DataFrame:
+    '''
+        Returns every reading of a category: the snapshot plus the delta fetched from PostgreSQL, which is
+        appended to the snapshot. Falls back to reading the whole table when snapshots are disabled.
+    '''
+
+    table_name = f"{category_name}_power_consumption"
+    if not snapshots_enabled():
+        return pd.read_sql_table(table_name=table_name, con=engine)
+
+    with category_lock(category_name):
+        segments = list_segments(category_name)
+        snapshot = read_segments(segments)
+        watermark = max((last for _, last, _ in segments), default=0)
+
+        # re-reading a few ids below the watermark catches rows whose transaction committed after later ids
+        delta = read_delta(engine, table_name, max(watermark - SNAPSHOT_ID_LOOKBACK, 0))
+        if not snapshot.empty:
+            delta = delta[~delta['id'].isin(snapshot['id'].to_numpy()[-SNAPSHOT_ID_LOOKBACK:])]
+
+        if not delta.empty:
+            segments.append(write_segment(category_name, delta))
+            snapshot = pd.concat([snapshot, delta], ignore_index=True) if not snapshot.empty else delta.reset_index(drop=True)
+            if not delta['id'].is_monotonic_increasing or delta['id'].iloc[0] < watermark:
+                snapshot = snapshot.sort_values('id', ignore_index=True)
+
+        # compacting the appended segments into a single one
+        if len(segments) > SNAPSHOT_MAX_SEGMENTS:
+            compacted = write_segment(category_name, snapshot)
+            for segment in segments:
+                if segment[2] != compacted[2]:
+                    os.remove(segment[2])
+
+    return snapshot
@@ -0,0 +1,124 @@
+'''
+    This script analyses csv uploads chunk by chunk: every chunk of complete lines is parsed on its own and
+    folded into running statistics and rollup buckets, so the memory used does not grow with the file size
+'''
+
+# Import necessary dependencies
+import hashlib
+import io
+import os
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from running_stats import RunningStatistics
+from rollups import merge_rollups, compute_rollups, to_aggregates
+from utils import get_plots
+
+
+class CsvAggregator:
+
+    """
+    Incremental analysis of a csv file of power readings (timestamp and power columns).
+
+    Bytes are fed in arbitrary chunks; complete lines are parsed and folded into a running aggregate and
+    the hourly, daily, weekly and monthly rollup buckets, and the partial last line is kept for the next chunk.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.remainder = b''
+        self.running = RunningStatistics()
+        self.rollups = {}
+
+    def feed(self, data: bytes):
+        """
+        Folds the complete lines of a chunk of the file into the aggregates
+        """
+        data = self.remainder + data
+        if self.header is None:
+            newline = data.find(b'\n')
+            if newline < 0:
+                self.remainder = data
+                return
+            self.header, data = data[:newline + 1], data[newline + 1:]
+
+        end = data.rfind(b'\n') + 1
+        self.remainder = data[end:]
+        if end:
+            self._fold(data[:end])
+
+    def close(self):
+        """
+        Folds the last line when the file does not end with a newline
+        """
+        if self.header is not None and self.remainder.strip():
+            self._fold(self.remainder)
+        self.remainder = b''
+
+    def _fold(self, lines: bytes):
+        chunk = pd.read_csv(io.BytesIO(self.header + lines), usecols=['timestamp', 'power'])
+        chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+        self.running.merge(RunningStatistics.from_series(chunk['power']))
+        self.rollups = merge_rollups(self.rollups, compute_rollups(chunk))
+
+    @property
+    def count(self) -> int:
+        return self.running.count
+
+    def statistics(self) -> dict:
+        """
+        Returns the statistics in the same shape as `utils.get_stats`
+        """
+        return self.running.to_stats()
+
+    def weekday_means(self) -> pd.Series:
+        """
+        Returns the mean of the daily average power per (year, month, day of week), from the daily buckets.
+        Days without readings are counted with a NaN mean, like resample does
+        """
+        means = to_aggregates({'daily': self.rollups['daily']})['daily']['mean']
+        days = means.index
+        return means.groupby([days.year.rename('year'), days.month.rename('month'),
+                              days.dayofweek.rename('day')]).mean()
+
+    def plots(self) -> dict:
+        """
+        Returns the plots of `utils.get_plots` built from the aggregates. The night and slope highlighted
+        plot is drawn from the hourly means, as the readings themselves are not kept
+        """
+        aggregates = to_aggregates(self.rollups)
+        hourly = aggregates['hourly']['mean'].dropna()
+        df = pd.DataFrame({'timestamp': hourly.index, 'power': hourly.to_numpy()})
+        return get_plots(df, aggregates, weekday_means=self.weekday_means())
+
+
+def analyse_file(path: str, chunk_size: int) -> dict:
+    '''
+        Reads a csv file chunk by chunk and returns its statistics and plots, then deletes it.
+        Raises ValueError when it has no readings.
+    '''
+
+    try:
+        aggregator = CsvAggregator()
+        with open(path, 'rb') as f:
+            while contents := f.read(chunk_size):
+                aggregator.feed(contents)
+        aggregator.close()
+    finally:
+        os.remove(path)
+
+    if aggregator.count == 0:
+        raise ValueError("The file has no power readings")
+    return {"statistics": aggregator.statistics(), "plots": aggregator.plots()}
+
+
+async def spool_upload(file, path: str, chunk_size: int) -> str:
+    '''
+        Writes an uploaded file to path chunk by chunk and returns the sha256 hex digest of its content.
+    '''
+
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while contents := await file.read(chunk_size):
+            digest.update(contents)
+            await run_in_threadpool(f.write, contents)
+    return digest.hexdigest()
@@ -0,0 +1,55 @@
+'''
+    Tests of the downsampling of decimation.py: the number of points kept never exceeds max_points
+'''
+
+# Import necessary dependencies
+import numpy as np
+import pytest
+from decimation import lttb, minmax
+
+
+def series(seed: int, n: int, nan_runs: bool = False) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    y = np.cumsum(rng.normal(0, 1, n))
+    if nan_runs:
+        # runs of missing readings, some of them longer than a bucket
+        for start in rng.integers(0, n, 8):
+            y[start:start + int(rng.integers(1, n // 4 + 2))] = np.nan
+    return y
+
+
+@pytest.mark.parametrize('nan_runs', [False, True])
+@pytest.mark.parametrize('n', [5, 17, 1000, 10007])
+@pytest.mark.parametrize('max_points', [2, 3, 4, 5, 100, 1000])
+def test_minmax_keeps_at_most_max_points(max_points, n, nan_runs):
+    y = series(n + max_points, n, nan_runs)
+    kept = minmax(y, max_points)
+    assert len(kept) <= min(max_points, n)
+    assert np.all(np.diff(kept) > 0)
+    if max_points < n:
+        assert kept[0] == 0 and kept[-1] == n - 1
+
+
+def test_minmax_uses_every_point_it_is_allowed():
+    y = series(0, 10000)
+    for max_points in (4, 100, 1000, 1001):
+        assert len(minmax(y, max_points)) == max_points - max_points % 2
+
+
+def test_minmax_keeps_the_extremes_of_the_inner_points():
+    y = series(1, 5000, nan_runs=True)
+    kept = minmax(y, 100)
+    inner = y[1:-1]
+    assert np.nanmax(inner) in y[kept] and np.nanmin(inner) in y[kept]
+
+
+def test_minmax_and_lttb_keep_everything_below_max_points():
+    y = series(2, 50)
+    assert np.array_equal(minmax(y, 50), np.arange(50))
+    assert np.array_equal(lttb(np.arange(50), y, 80), np.arange(50))
+
+
+@pytest.mark.parametrize('max_points', [3, 4, 100, 1000])
+def test_lttb_keeps_max_points(max_points):
+    y = series(3, 10000, nan_runs=True)
+    assert len(lttb(np.arange(len(y)), y, max_points)) == max_points
@@ -0,0 +1,207 @@
+'''
+    Golden tests of the figure documents built by plot_spec: every plot must be the document of the plotly figure
+    it replaced, traces, layout, shapes and annotations included. The references below build those figures
+    with plotly like the former implementation of plots.py did
+'''
+
+# Import necessary dependencies
+import json
+from collections import Counter
+import numpy as np
+import orjson
+import pandas as pd
+import plotly
+import plotly.express as px
+import plotly.graph_objects as go
+import pytest
+from plotly.subplots import make_subplots
+from decimation import decimate
+from plot_spec import to_json
+from plots import get_aggregate_plots, get_weekday_plots, get_night_and_slope_highlight_plot, weekday_means, \
+    night_time_zones, positive_slope_zones, get_stats, time_interval_mapping, month_dict, day_dict
+from rollups import compute_rollups, to_aggregates
+
+
+def plotly_document(fig) -> dict:
+    return json.loads(json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def document(spec: dict) -> dict:
+    return orjson.loads(to_json(spec))
+
+
+def reference_aggregate_plot(state, duration_avg, duration_max, duration_min) -> dict:
+    fig = make_subplots(rows=1, cols=1, shared_xaxes=True, vertical_spacing=0.02)
+    fig.add_trace(go.Scatter(x=duration_avg.index, y=duration_avg.values, mode='lines',
+                             name=f'{state} Average Power Consumption'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=duration_max.index, y=duration_max.values, mode='markers',
+                             name=f'{state} Max Power Consumption', marker=dict(size=8, color='red')), row=1, col=1)
+    fig.add_trace(go.Scatter(x=duration_min.index, y=duration_min.values, mode='markers',
+                             name=f'{state} Min Power Consumption', marker=dict(size=8, color='green')), row=1, col=1)
+    buttons = [
+        dict(label='Max', method='restyle', args=[{'visible': [False, True, False]}]),
+        dict(label='Min', method='restyle', args=[{'visible': [False, False, True]}]),
+        dict(label='Average', method='restyle', args=[{'visible': [True, False, False]}]),
+        dict(label='All', method='restyle', args=[{'visible': [True, True, True]}])
+    ]
+    fig.update_xaxes(title_text="Timestamp", row=1, col=1)
+    fig.update_yaxes(title_text=f"{state} Power Consumption", row=1, col=1)
+    fig.update_layout(showlegend=True, updatemenus=[dict(
+        type='buttons', showactive=True, buttons=buttons, x=1.20, y=0.6)], height=600)
+    return plotly_document(fig)
+
+
+def reference_aggregate_plots(data_frame, aggregates=None) -> dict:
+    df = data_frame.set_index('timestamp')
+    plots = {}
+    for interval, symbol in time_interval_mapping.items():
+        state = interval.capitalize()
+        if aggregates is not None:
+            duration = aggregates[interval]
+        else:
+            duration = df['power'].resample(symbol).agg(['mean', 'max', 'min'])
+        plots[f'{interval}_plot'] = reference_aggregate_plot(state, duration['mean'], duration['max'], duration['min'])
+    return plots
+
+
+def reference_weekday_plots(data_frame) -> dict:
+    group_mean = weekday_means(data_frame)
+
+    # the former loop, verbatim: NaN means are kept (serialized as null), absent days are 0
+    year_dict = Counter()
+    for item in group_mean.index:
+        year_dict[int(item[0])] = Counter()
+    for year in year_dict.keys():
+        for month in range(1, 13):
+            year_dict[year][month] = Counter()
+    for item in zip(group_mean.index, group_mean.values):
+        year_dict[int(item[0][0])][int(item[0][1])][int(item[0][2])] = round(item[1], 2)
+
+    plots = {}
+    for year in year_dict.keys():
+        for i in range(1, 13):
+            plotable_dict = year_dict[year][i]
+            if len(plotable_dict.keys()) == 0:
+                continue
+            plotable_dict = {
+                'day_name': [day_dict[x] for x in range(0, 7)],
+                'power': [0 if x not in plotable_dict else plotable_dict[x] for x in range(0, 7)]
+            }
+            fig = px.bar(pd.DataFrame(plotable_dict), x='day_name', y='power', text='power',
+                         title=f'{month_dict[i]}, {year}')
+            fig.update_xaxes(title_text='Day Of Weeks')
+            fig.update_yaxes(title_text='Power (W)')
+            plots.setdefault(str(year), {})[month_dict[i]] = plotly_document(fig)
+    return plots
+
+
+def reference_night_and_slope_plot(df, title='Power (W)', start=20, end=6, dist_to_check=5, min_slope=5, tz=None,
+                                   max_points=None, decimation='lttb') -> dict:
+    layout = go.Layout(
+        title=title, plot_bgcolor="#FFF", hovermode="x", hoverdistance=100, spikedistance=1000,
+        xaxis=dict(title="Time", linecolor="#BCCCDC", showgrid=False, showspikes=True, spikethickness=2,
+                   spikedash="dot", spikecolor="#999999", spikemode="across"),
+        yaxis=dict(title="Power (W)", linecolor="#BCCCDC"),
+        showlegend=False,
+    )
+    if max_points and len(df.index) > max_points:
+        kept = decimate(df['timestamp'].to_numpy().astype('datetime64[ns]').astype(np.int64),
+                        df['power'].to_numpy(), max_points, decimation)
+    else:
+        kept = np.arange(len(df.index))
+    fig = go.Figure(go.Scatter(x=df['timestamp'].iloc[kept], y=df['power'].iloc[kept], name=title), layout=layout)
+
+    for zone_start, zone_end in night_time_zones(df, timestamp_col='timestamp', start=start, end=end, tz=tz):
+        fig.add_vrect(x0=df['timestamp'][zone_start], x1=df['timestamp'][zone_end], annotation_text="Night",
+                      fillcolor='purple', opacity=0.2, annotation_position="top left",
+                      annotation=dict(font_size=20, font_family="Times New Roman"))
+
+    for zone_start, zone_end in positive_slope_zones(df, use_col='power', dist_to_check=dist_to_check, min_slope=min_slope):
+        zone = df.iloc[np.union1d(kept[(kept >= zone_start) & (kept <= zone_end)], [zone_start, zone_end])]
+        fig.add_trace(go.Scatter(x=zone['timestamp'], y=zone['power'], mode='lines', line=dict(color='red'),
+                                 hoverinfo='skip', showlegend=False))
+
+    y_values = get_stats(df, use_col='power')
+    for i, color in enumerate(['green', 'yellow', 'orange', 'red']):
+        fig.add_hrect(y0=y_values[i], y1=y_values[i + 1], fillcolor=color, opacity=0.2, layer="below")
+    return plotly_document(fig)
+
+
+def readings(seed: int, rows: int, freq: str = '7min', gap: bool = False, integer: bool = False) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range('2023-01-28 17:00', periods=rows, freq=freq)
+    power = np.abs(np.cumsum(rng.normal(0, 20, rows))) + rng.uniform(0, 5, rows)
+    if integer:
+        power = power.round().astype(np.int64)
+    df = pd.DataFrame({'timestamp': timestamps, 'power': power})
+    if gap:
+        # a few days without readings leave empty buckets and unplotted months
+        df = df[(df['timestamp'] < '2023-02-03') | (df['timestamp'] > '2023-03-10')].reset_index(drop=True)
+    return df
+
+
+cases = {
+    'small': dict(seed=0, rows=40),
+    'gap': dict(seed=1, rows=12000, gap=True),
+    'integer': dict(seed=2, rows=3000, integer=True),
+    'hourly': dict(seed=3, rows=2000, freq='1H'),
+}
+
+
+@pytest.mark.parametrize('case', cases)
+def test_aggregate_plots_match_plotly(case):
+    df = readings(**cases[case])
+    plots = get_aggregate_plots(df)
+    expected = reference_aggregate_plots(df)
+    assert plots.keys() == expected.keys()
+    for name in plots:
+        assert document(plots[name]) == expected[name], name
+
+
+@pytest.mark.parametrize('case', cases)
+def test_aggregate_plots_from_rollups_match_plotly(case):
+    df = readings(**cases[case])
+    aggregates = to_aggregates(compute_rollups(df))
+    plots = get_aggregate_plots(df, aggregates)
+    expected = reference_aggregate_plots(df, aggregates)
+    for name in plots:
+        assert document(plots[name]) == expected[name], name
+
+
+@pytest.mark.parametrize('case', cases)
+def test_weekday_plots_match_plotly(case):
+    df = readings(**cases[case])
+    plots = {str(year): {month: document(plot) for month, plot in months.items()}
+             for year, months in get_weekday_plots(df)['weekday_plot'].items()}
+    assert plots == reference_weekday_plots(df)
+
+
+def test_weekday_plots_keep_nulls_in_gaps():
+    df = readings(**cases['gap'])
+    plots = get_weekday_plots(df)['weekday_plot']
+
+    # only 2023-02-01 and 2023-02-02 (a Wednesday and a Thursday) have readings in February
+    february = document(plots[2023]['February'])['data'][0]
+    assert [value is None for value in february['y']] == [True, True, False, False, True, True, True]
+    assert february['text'] == february['y']
+
+
+@pytest.mark.parametrize('max_points', [None, 500])
+@pytest.mark.parametrize('case', cases)
+def test_night_and_slope_plot_matches_plotly(case, max_points):
+    df = readings(**cases[case])
+    plot = document(get_night_and_slope_highlight_plot(df, max_points=max_points)['night_and_slope_highlighted_plot'])
+    expected = reference_night_and_slope_plot(df, max_points=max_points)
+
+    # compared part by part first, so a failure points at the part that differs
+    assert plot['data'] == expected['data']
+    assert plot['layout'].get('shapes') == expected['layout'].get('shapes')
+    assert plot['layout'].get('annotations') == expected['layout'].get('annotations')
+    assert plot == expected
+
+
+def test_night_and_slope_plot_matches_plotly_in_a_timezone():
+    df = readings(seed=4, rows=3000)
+    plot = get_night_and_slope_highlight_plot(df, tz='Europe/Paris', decimation='minmax', max_points=300)
+    expected = reference_night_and_slope_plot(df, tz='Europe/Paris', decimation='minmax', max_points=300)
+    assert document(plot['night_and_slope_highlighted_plot']) == expected
@@ -0,0 +1,146 @@
+'''
+    Tests of the plots module. The vectorized positive_slope_zones is checked against the row by row
+    implementation it replaced
+'''
+
+# Import necessary dependencies
+import numpy as np
+import pandas as pd
+import pytest
+from plots import positive_slope_zones
+
+
+def linregress_slope(x, y) -> float:
+    # slope of the least squares line, as returned first by scipy.stats.linregress
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    dx = x - x.mean()
+    return float((dx * (y - y.mean())).sum() / (dx * dx).sum())
+
+
+def reference_positive_slope_zones(df: pd.DataFrame, use_col: str, dist_to_check=5, min_slope=1):
+    """
+    The former row by row implementation of positive_slope_zones (scipy's linregress aside)
+    """
+    pos_slope_zone = []  # Value to store the negative slope zone
+
+    start = ...  # Start of the zone
+
+    # Iterating through each rows
+    for j in range(len(df.index)):
+        indi = j  # Index of the current row
+
+        # Left Value
+        if j != 0:
+            left = df.iloc[j - 1][use_col]
+        else:
+            left = df.iloc[j][use_col]
+
+        current = df.iloc[j][use_col]  # Current Value
+        # Next value is assigned after next If Statement to avoid the Index Out of Bound Error
+
+        # Consider the end of the zone as maxima or not by comparing it with its previous value
+        if j == df.shape[0] - 1:
+            if current > left:
+                pos_slope_zone.append((start, indi))
+            continue
+
+        right = df.iloc[j + 1][use_col]  # Next Value
+
+        # Consider the start of the zone as minima or not by comparing it with its next value
+        if j == 0:
+            # Compare only with the next value
+            if current <= right:
+                start = indi
+            continue
+
+        # Assign a point as minima if it's lower than both of left and right point
+        if current <= left and current < right:
+            start = indi
+            continue
+
+        # Assign a point as maxima if it's higher than both of left and right point
+        if current > left and current >= right:
+            pos_slope_zone.append([start, indi])
+            continue
+
+    # Merge two pairs which belongs to same slope but seperated due to a flat line or some noise in between
+    i = 0  # counter
+
+    # Iterate through each zone
+    while i < len(pos_slope_zone) - 1:
+
+        # If the distance between the end of the first zone and the start of the second zone is less than dist_to_check
+        # and the value at the end of the first zone is lesser than the value at the start of the second zone
+        if (pos_slope_zone[i + 1][0] - pos_slope_zone[i][1] <= dist_to_check and
+                df[use_col].iloc[pos_slope_zone[i + 1][0]] >= df[use_col].iloc[pos_slope_zone[i][1]]):
+            # Merge the two zones
+            pos_slope_zone[i][1] = pos_slope_zone[i + 1][1]
+            pos_slope_zone.pop(i + 1)
+
+            # Decrement the counter to check the merged zone with the next zone
+            i -= 1
+
+        i += 1
+
+    # Remove zones with slope less than min_slope
+    if min_slope:
+
+        # Iterate through each zone
+        i = 0  # counter
+        while i < len(pos_slope_zone) - 1:
+
+            # Calculate the slope of the zone
+            slope = linregress_slope(df.iloc[pos_slope_zone[i][0]:pos_slope_zone[i][1] + 1].index,
+                                     df[use_col].iloc[pos_slope_zone[i][0]:pos_slope_zone[i][1] + 1])
+
+            # If the slope is less than min_slope, remove the zone
+            if slope < min_slope:
+                pos_slope_zone.pop(i)
+
+                # Decrement the counter to check the next zone
+                i -= 1
+
+            i += 1
+
+    return tuple(tuple(zone) for zone in pos_slope_zone)
+
+
+def assert_same_zones(values, dist_to_check, min_slope):
+    df = pd.DataFrame({'power': values})
+    expected = reference_positive_slope_zones(df, 'power', dist_to_check=dist_to_check, min_slope=min_slope)
+    assert positive_slope_zones(df, 'power', dist_to_check=dist_to_check, min_slope=min_slope) == expected
+
+
+@pytest.mark.parametrize('dist_to_check', [1, 5])
+@pytest.mark.parametrize('min_slope', [0, 1, 5])
+@pytest.mark.parametrize('seed', range(10))
+def test_positive_slope_zones_matches_reference_on_random_series(seed, min_slope, dist_to_check):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(3, 400))
+    # a random walk with repeated values, so flat stretches and ties between neighbours occur
+    values = np.cumsum(rng.choice([-10, -3, 0, 0, 2, 7, 15], n)) + rng.normal(0, 0.5, n).round() * (seed % 2)
+    assert_same_zones(values, dist_to_check, min_slope)
+
+
+@pytest.mark.parametrize('dist_to_check', [1, 5])
+@pytest.mark.parametrize('min_slope', [0, 1, 5])
+@pytest.mark.parametrize('values', [
+    [5.0],
+    [1.0, 2.0],
+    [2.0, 1.0],
+    [3.0, 3.0],
+    [4.0, 4.0, 4.0, 4.0],
+    [0.0, 10.0, 10.0, 10.0, 20.0, 5.0],
+    [0.0, 0.0, 0.0, 30.0, 30.0, 30.0, 0.0, 0.0, 60.0],
+    [10.0, 0.0, 1.0, 2.0, 2.0, 9.0, 3.0, 50.0],
+    [0.0, 1.0, 0.0, 1.0, 0.0, 1.0, 0.0, 1.0],
+], ids=lambda values: f'n{len(values)}')
+def test_positive_slope_zones_matches_reference_on_edge_cases(values, min_slope, dist_to_check):
+    assert_same_zones(values, dist_to_check, min_slope)
+
+
+def test_positive_slope_zones_uses_index_as_x():
+    # slopes are computed against the index, as the former implementation did
+    df = pd.DataFrame({'power': [0.0, 3.0, 0.0, 30.0, 0.0, 1.0]}, index=[0, 10, 20, 21, 22, 40])
+    assert positive_slope_zones(df, 'power', dist_to_check=0, min_slope=1) == \
+        reference_positive_slope_zones(df, 'power', dist_to_check=0, min_slope=1)
@@ -6,27 +6,78 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
 from collections import Counter
-from plots import get_aggregate_plots, get_night_and_slope_highlight_plot, get_weekday_plots
+from functools import lru_cache
+from plots import get_aggregate_plots, get_night_and_slope_highlight_plot, get_weekday_plots, weekday_month_plot
+from config import NIGHT_TIMEZONE, PLOT_DECIMATION
+from plot_spec import to_json
+from metrics import STAGE_LATENCY
 
 
-def get_plots(data_frame: pd.DataFrame):
+def get_plots(data_frame: pd.DataFrame, aggregates: dict = None, max_points: int = None, weekday_means: pd.Series = None):
 
     '''
-        Generates various types of plots based on power consumption data.
+        Generates various types of plots based on power consumption data, as plotly figure documents
+        (encoded once, together with the rest of the response).
+        Precomputed interval aggregates (see `rollups.to_aggregates`) can be passed to skip resampling,
+        the (year, month, day of week) means (see `aggregation.query_weekday_means`) to skip the daily resampling,
+        and max_points limits the number of readings drawn in the night and slope highlighted plot.
     '''
 
     df = data_frame.copy()
     df['timestamp'] = pd.to_datetime(df['timestamp'])
     plots_json = {}
-    weekday_plots_json = get_weekday_plots(df)
-    aggregate_plots_json = get_aggregate_plots(df)
-    night_and_slope_highlighted_plots_json = get_night_and_slope_highlight_plot(df)
+    with STAGE_LATENCY.labels('weekday_plots').time():
+        weekday_plots_json = get_weekday_plots(df, weekday_means)
+    with STAGE_LATENCY.labels('aggregate_plots').time():
+        aggregate_plots_json = get_aggregate_plots(df, aggregates)
+    with STAGE_LATENCY.labels('night_and_slope_plot').time():
+        night_and_slope_highlighted_plots_json = get_night_and_slope_highlight_plot(df, tz=NIGHT_TIMEZONE, max_points=max_points, decimation=PLOT_DECIMATION)
     plots_json.update(aggregate_plots_json)
     plots_json.update(weekday_plots_json)
     plots_json.update(night_and_slope_highlighted_plots_json)
     return plots_json
 
 
+def get_detail_level_plots(data_frame: pd.DataFrame, max_points: int):
+
+    '''
+        Generates only the night and slope highlighted plot, downsampled to max_points readings.
+    '''
+
+    df = data_frame.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return get_night_and_slope_highlight_plot(df, tz=NIGHT_TIMEZONE, max_points=max_points, decimation=PLOT_DECIMATION)
+
+
+@lru_cache(maxsize=1024)
+def get_weekday_month_plot(year: int, month: int, means: tuple, present: tuple) -> bytes:
+
+    '''
+        Renders the json body of the weekday plot of one month from its 7 means and the mask of the ones present
+        (see `plots.weekday_pivot`). Renders are memoized on the means, so a month is only rendered again when its
+        means change.
+    '''
+
+    return to_json(weekday_month_plot(year, month, means, present)).encode('utf-8')
+
+
+def to_legacy_plots(plots: dict) -> dict:
+
+    '''
+        Converts plots to the former format, where every figure document is itself a json string,
+        for clients which still parse the plots twice.
+    '''
+
+    legacy = {}
+    for name, plot in plots.items():
+        if name == 'weekday_plot':
+            legacy[name] = {year: {month: to_json(figure) for month, figure in months.items()}
+                            for year, months in plot.items()}
+        else:
+            legacy[name] = to_json(plot)
+    return legacy
+
+
 def get_stats(df: pd.DataFrame):
 
     '''
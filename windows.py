@@ -0,0 +1,129 @@
+'''
+    This script serves plots and statistics over a time window. Only the readings of the window are fetched from
+    the database and the results are cached per (category, window)
+'''
+
+# Import necessary dependencies
+from datetime import datetime, timedelta, timezone
+import re
+import pandas as pd
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from models import category_classes
+from utils import get_plots, get_stats
+from rollups import to_aggregates
+from aggregation import query_rollups_async, query_weekday_means_async
+from cache import ResultCache
+from config import WINDOW_CACHE_MAX_ENTRIES, WINDOW_CACHE_TTL
+
+# cache of the results computed for a window
+window_cache = ResultCache('window', WINDOW_CACHE_MAX_ENTRIES, WINDOW_CACHE_TTL)
+
+# units accepted in a lookback interval such as '12h' or '7d'
+interval_units = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_interval(interval: str) -> timedelta:
+    '''
+        Parses a lookback interval made of a number and a unit (m, h, d or w), e.g. '7d'. Raises ValueError.
+    '''
+
+    match = re.fullmatch(r'(\d+)([mhdw])', interval.strip().lower())
+    if match is None:
+        raise ValueError(f"Invalid interval '{interval}', expected e.g. '30m', '12h', '7d' or '4w'")
+    return timedelta(**{interval_units[match.group(2)]: int(match.group(1))})
+
+
+def resolve_window(start: datetime = None, end: datetime = None, interval: str = None):
+    '''
+        Returns the (start, end) naive UTC bounds of a window. The end defaults to the current minute
+        (so repeated requests share a cache entry) and the start to end - interval, or to the first reading.
+        Returns None when no window is requested.
+    '''
+
+    if start is None and end is None and interval is None:
+        return None
+
+    def to_naive_utc(value):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if end is None:
+        end = datetime.utcnow().replace(second=0, microsecond=0)
+    if start is None and interval is not None:
+        start = end - parse_interval(interval)
+    if start is None:
+        start = datetime.min
+    if start > end:
+        raise ValueError("The start of the window is after its end")
+    return start, end
+
+
+def window_name(category_name: str, kind: str, window, *extra) -> str:
+    '''
+        Returns the cache entry name of a result computed over a window.
+    '''
+
+    start, end = window
+    return '_'.join([category_name, kind, start.isoformat(), end.isoformat(), *(str(item) for item in extra)])
+
+
+async def load_window(session, category_name: str, window) -> pd.DataFrame:
+    '''
+        Fetches the readings of a category within the window (bounds included), using the timestamp index.
+    '''
+
+    start, end = window
+    table = category_classes[category_name]
+    result = await session.execute(
+        select(table.timestamp, table.power, table.category)
+        .where(table.timestamp.between(start, end))
+        .order_by(table.timestamp))
+    return pd.DataFrame(result.all(), columns=['timestamp', 'power', 'category'])
+
+
+async def cached_window_result(session, category_name: str, kind: str, window, compute, *extra) -> bytes:
+    '''
+        Returns the cached result of `await compute(df)` over the window, computing and caching it on a miss.
+        Returns None when the window holds no reading.
+    '''
+
+    name = window_name(category_name, kind, window, *extra)
+    data = await window_cache.get(name)
+    if data is not None:
+        return data
+
+    df = await load_window(session, category_name, window)
+    if df.empty:
+        return None
+
+    return await window_cache.set(name, await compute(df))
+
+
+async def window_statistics(session, category_name: str, window) -> bytes:
+    '''
+        Returns the cached statistics of the readings of a window.
+    '''
+
+    async def compute(df):
+        # the computation is cpu bound, so it runs in the threadpool
+        return await run_in_threadpool(get_stats, df)
+
+    return await cached_window_result(session, category_name, 'statistics', window, compute)
+
+
+async def window_plots(session, category_name: str, window, max_points: int = None) -> bytes:
+    '''
+        Returns the cached plots of a window. Interval and weekday aggregates are computed by the database.
+    '''
+
+    table_name = category_classes[category_name].__tablename__
+
+    async def compute(df):
+        rollups = await query_rollups_async(session, table_name, window)
+        weekdays = await query_weekday_means_async(session, table_name, window)
+        return await run_in_threadpool(get_plots, df, to_aggregates(rollups), max_points, weekdays)
+
+    return await cached_window_result(session, category_name, 'plot', window, compute, max_points)